@@ -20,9 +20,10 @@ class FingerboardParkProWorkbench(getattr(FreeCADGui, "Workbench", object)):
     
     MenuText = "Fingerboard Park Pro"
     def Initialize(self):
-        import commands
-        # Aggiungi "FB_Split" prima di "FB_Bake"
-        self.cmd_list = ["FB_Kicker", "FB_QP", "FB_Ledge", "FB_Steps", "FB_Hubba", "FB_Jersey", "FB_Base", "FB_Proxy", "FB_SplitConfirm", "FB_Bake", "FB_TextureToggle"]    
+        import registry
+        # Solo il catalogo: commands, features e i pacchetti di ostacoli
+        # vengono importati al primo uso di un comando
+        self.cmd_list = registry.install()
         self.appendToolbar("Ostacoli V13 Pro", self.cmd_list)
 
     def GetClassName(self): return "Gui::PythonWorkbench"
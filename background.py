@@ -0,0 +1,202 @@
+import os
+import shutil
+import tempfile
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    import FreeCAD as fc  # type: ignore
+else:
+    try:
+        import FreeCAD as fc
+    except Exception:
+        fc = None
+
+import brick_utils
+import features
+import merge
+import shape_cache
+import split
+import workers
+
+# Lavori lunghi lanciati dalla GUI: il calcolo gira nei worker (o, in ripiego,
+# tra un processEvents e l'altro) con barra di avanzamento e tasto Annulla.
+# Il documento viene modificato solo alla fine, in un'unica transazione.
+
+def _dialog(title, total):
+    from PySide import QtCore, QtWidgets # type: ignore
+    dlg = QtWidgets.QProgressDialog(title, "Annulla", 0, total)
+    dlg.setWindowTitle("Fingerboard Park Pro")
+    dlg.setWindowModality(QtCore.Qt.WindowModal)
+    dlg.setMinimumDuration(0)
+    dlg.setValue(0)
+    return dlg
+
+def _process_events():
+    from PySide import QtWidgets # type: ignore
+    QtWidgets.QApplication.processEvents()
+
+def run_with_progress(title, jobs, on_done):
+    """Esegue i job nei worker mostrando l'avanzamento per job e per gruppo di
+    fughe. Ritorna False se i worker non sono disponibili; solleva
+    workers.Cancelled se l'utente annulla."""
+    dlg = _dialog(title, len(jobs))
+    count = [0]
+    def done(i, job):
+        count[0] += 1
+        dlg.setValue(count[0])
+        on_done(i, job)
+    def progress(i, msg):
+        dlg.setLabelText(f"{jobs[i].get('label', title)}: {msg}")
+    try:
+        return workers.run_jobs(jobs, done, on_progress=progress, cancelled=dlg.wasCanceled, poll=_process_events)
+    finally:
+        dlg.close()
+
+def apply_lod(doc, level):
+    """Passa il documento a un nuovo livello di dettaglio. Ritorna False se annullato."""
+    if level == "Export" and workers.parallel_enabled() and shape_cache.enabled():
+        changed = features.lod_changes(doc, level)
+        pending = workers.pending_exports(changed)
+        if len(pending) > 1:
+            # Le texture vengono calcolate nei worker e finiscono nella cache forme;
+            # quelle fallite verranno ricalcolate in serie qui sotto.
+            def on_done(i, job):
+                if job is not None:
+                    shape_cache.put(pending[i][1], workers.load_shape(job["output"]))
+            try:
+                run_with_progress("Calcolo texture...", [workers.build_job(o) for o, _ in pending], on_done)
+            except workers.Cancelled:
+                return False
+    return _apply_serial(doc, level)
+
+def _apply_serial(doc, level):
+    """Applica il livello ricalcolando un oggetto alla volta; le forme già in
+    cache tornano subito. L'annullamento ripristina lo stato di partenza."""
+    previous = features.document_lod(doc)
+    doc.openTransaction("Livello di dettaglio")
+    changed = features.set_document_lod(doc, level)
+    dlg = _dialog("Ricalcolo ostacoli...", len(changed))
+    current = [""]
+    def report(msg):
+        dlg.setLabelText(f"{current[0]}: {msg}")
+        _process_events()
+    brick_utils.progress_hook = report
+    try:
+        for i, obj in enumerate(changed):
+            if dlg.wasCanceled():
+                doc.abortTransaction()
+                meta = doc.Meta
+                meta[features.LOD_META_KEY] = previous
+                doc.Meta = meta
+                for o in changed:
+                    o.purgeTouched()
+                return False
+            current[0] = obj.Label
+            report("ricalcolo")
+            obj.recompute()
+            dlg.setValue(i + 1)
+        doc.recompute()
+        doc.commitTransaction()
+        return True
+    finally:
+        brick_utils.progress_hook = None
+        dlg.close()
+
+def split_target(target, placements):
+    """Esegue lo split fuori dal thread della GUI. Un piano: split con perno
+    classico; più piani: split multiplo in un solo passaggio.
+    Ritorna la lista dei pezzi o None se annullato."""
+    workdir = tempfile.mkdtemp(prefix="fbsplit_")
+    try:
+        path = os.path.join(workdir, "target.brep")
+        target.Shape.exportBrep(path)
+        job = {"label": target.Label, "input": path}
+        if len(placements) == 1:
+            job.update(task="split", placement=split.placement_to_list(placements[0]))
+        else:
+            job.update(task="split_planes", placements=[split.placement_to_list(p) for p in placements])
+        result = []
+        def on_done(i, job):
+            if job is not None:
+                result.extend(workers.load_shape(job["output"]).childShapes())
+        try:
+            ran = run_with_progress("Split in corso...", [job], on_done)
+        except workers.Cancelled:
+            return None
+        if ran and len(result) >= 2:
+            return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    # Ripiego: calcolo nel processo della GUI
+    dlg = _dialog("Split in corso...", 0)
+    def report(msg):
+        dlg.setLabelText(f"{target.Label}: {msg}")
+        _process_events()
+    try:
+        if len(placements) == 1:
+            return list(split.split_by_proxy(target.Shape, placements[0], report))
+        return split.split_by_planes(target.Shape, placements, report)
+    finally:
+        dlg.close()
+
+def export_stl(doc, path, deflection, objs=None, mesh_texture=None):
+    """Esporta il parco in STL con le mesh calcolate nei worker.
+    Ritorna il numero di triangoli o None se annullato."""
+    import export
+    def run(jobs, on_done):
+        return run_with_progress("Tessellazione...", jobs, on_done)
+    dlg = []
+    def report(msg):
+        if not dlg: # aperta solo se resta da tessellare in serie
+            dlg.append(_dialog("Esportazione STL...", 0))
+        dlg[0].setLabelText(msg)
+        _process_events()
+    try:
+        return export.export_park(doc, path, deflection, objs, run, report, mesh_texture)
+    except workers.Cancelled:
+        return None
+    finally:
+        for d in dlg:
+            d.close()
+
+def merge_objects(objs):
+    """Unisce gli oggetti per gruppi connessi, un gruppo per worker.
+    Ritorna (gruppi di oggetti, forme fuse) o None se annullato; la forma dei
+    gruppi di un solo oggetto è None."""
+    shapes = [o.Shape for o in objs]
+    groups = merge.clusters(len(shapes), merge.touching_pairs(shapes))
+    # Gli oggetti isolati restano come sono: nessuna forma da calcolare
+    fused = [None] * len(groups)
+    todo = [k for k, g in enumerate(groups) if len(g) > 1]
+    if len(todo) > 1:
+        workdir = tempfile.mkdtemp(prefix="fbmerge_")
+        try:
+            jobs = []
+            for k in todo:
+                inputs = []
+                for i in groups[k]:
+                    inputs.append(os.path.join(workdir, f"in{i}.brep"))
+                    shapes[i].exportBrep(inputs[-1])
+                jobs.append({"task": "merge", "label": f"Gruppo {k + 1}", "inputs": inputs})
+            def on_done(n, job):
+                if job is not None:
+                    fused[todo[n]] = workers.load_shape(job["output"])
+            try:
+                run_with_progress("Unione in corso...", jobs, on_done)
+            except workers.Cancelled:
+                return None
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    # Ripiego (o gruppo unico): calcolo nel processo della GUI
+    missing = [k for k in todo if fused[k] is None]
+    dlg = _dialog("Unione in corso...", len(missing))
+    try:
+        for n, k in enumerate(missing):
+            if dlg.wasCanceled():
+                return None
+            dlg.setLabelText(f"Gruppo {k + 1}: {len(groups[k])} oggetti")
+            _process_events()
+            fused[k] = merge.fuse([shapes[i] for i in groups[k]])
+            dlg.setValue(n + 1)
+    finally:
+        dlg.close()
+    return [[objs[i] for i in g] for g in groups], fused
@@ -0,0 +1,147 @@
+"""Generatore di parchi senza GUI a partire da una specifica JSON.
+
+Uso con FreeCADCmd:
+
+    FreeCADCmd -c "import batch; batch.main('plaza.json', 'clienti/altro.json')"
+
+Formato della specifica:
+
+    {
+      "name": "plaza",
+      "lod": "Export",
+      "output": {"dir": "out", "format": "stl", "merge": false,
+                 "deflection": 0.05, "parallel": true, "save": false},
+      "objects": [
+        {"type": "Ledge", "name": "Ledge1", "params": {"Length": 150},
+         "position": [0, 0, 8], "rotation": 90}
+      ]
+    }
+
+"type" è un nome del catalogo ostacoli, anche di un pacchetto esterno (o della
+classe, es. "FB_Ledge");
+"rotation" è un angolo attorno a Z in gradi oppure {"axis": [x, y, z], "angle": gradi}.
+I file per oggetto sono in coordinate locali (pronti per la stampa), il file
+unico ("merge": true) mantiene la disposizione del parco.
+"""
+import json
+import os
+import sys
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    import FreeCAD as fc  # type: ignore
+    import Part  # type: ignore
+else:
+    try:
+        import FreeCAD as fc
+        import Part
+    except Exception:
+        fc = None
+        Part = None
+
+import features
+import registry
+import stl
+import workers
+
+FORMATS = ("stl", "step")
+
+def obstacle_class(type_name):
+    if type_name == "Base":
+        type_name = "BasePark"
+    try:
+        return registry.obstacle_class(type_name)
+    except KeyError:
+        raise ValueError(f"Tipo di ostacolo sconosciuto: {type_name}")
+
+def spec_placement(item):
+    pos = fc.Vector(*item.get("position", (0, 0, 0)))
+    rot = item.get("rotation", 0)
+    if isinstance(rot, dict):
+        rotation = fc.Rotation(fc.Vector(*rot["axis"]), rot["angle"])
+    else:
+        rotation = fc.Rotation(fc.Vector(0, 0, 1), rot)
+    return fc.Placement(pos, rotation)
+
+def _export(shape, path, fmt, deflection):
+    if fmt == "stl":
+        stl.write_shape(path, shape, deflection)
+    else:
+        shape.exportStep(path)
+
+def generate(spec, base_dir="."):
+    """Costruisce un parco ed esporta i file richiesti. Ritorna i percorsi scritti."""
+    name = spec.get("name", "Park")
+    out = spec.get("output", {})
+    fmt = out.get("format", "stl").lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato non supportato: {fmt}")
+    out_dir = os.path.join(base_dir, out.get("dir", "out"))
+    os.makedirs(out_dir, exist_ok=True)
+    deflection = out.get("deflection", 0.05)
+    merge, keep = out.get("merge", False), out.get("save", False)
+
+    doc = fc.newDocument(name)
+    written = []
+    try:
+        features.set_document_lod(doc, spec.get("lod", "Export"))
+        objs = []
+        for item in spec.get("objects", []):
+            obj = features.make_obstacle(doc, item.get("name", item["type"]), obstacle_class(item["type"]))
+            for key, value in item.get("params", {}).items():
+                if not hasattr(obj, key):
+                    raise ValueError(f"{item['type']}: parametro sconosciuto '{key}'")
+                setattr(obj, key, value)
+            obj.Placement = spec_placement(item)
+            objs.append(obj)
+
+        if out.get("parallel", True):
+            workers.prefetch(objs)
+
+        merged_path = os.path.join(out_dir, f"{name}.{fmt}")
+        writer = stl.StlWriter(merged_path) if merge and fmt == "stl" else None
+        step_shapes = []
+        try:
+            # Un oggetto alla volta: calcolo, esportazione, rilascio
+            for obj in objs:
+                obj.recompute()
+                shape = obj.Shape
+                if shape.isNull():
+                    fc.Console.PrintWarning(f"{obj.Label}: forma vuota, saltato\n")
+                elif writer is not None:
+                    writer.add_shape(shape, deflection)
+                elif merge:
+                    step_shapes.append(shape.copy())
+                else:
+                    local = shape.copy()
+                    local.Placement = fc.Placement()
+                    path = os.path.join(out_dir, f"{name}_{obj.Label}.{fmt}")
+                    _export(local, path, fmt, deflection)
+                    written.append(path)
+                if not keep:
+                    doc.removeObject(obj.Name)
+        finally:
+            if writer is not None:
+                writer.close()
+                written.append(merged_path)
+        if step_shapes:
+            Part.makeCompound(step_shapes).exportStep(merged_path)
+            written.append(merged_path)
+        if keep:
+            path = os.path.join(out_dir, f"{name}.FCStd")
+            doc.saveAs(path)
+            written.append(path)
+    finally:
+        fc.closeDocument(doc.Name)
+    return written
+
+def main(*spec_paths):
+    for spec_path in spec_paths:
+        with open(spec_path, encoding="utf-8") as f:
+            spec = json.load(f)
+        # Un file può contenere un parco o una lista di parchi
+        for park in (spec if isinstance(spec, list) else [spec]):
+            for path in generate(park, os.path.dirname(os.path.abspath(spec_path))):
+                fc.Console.PrintMessage(f"Scritto {path}\n")
+
+if __name__ == "__main__":
+    main(*[a for a in sys.argv[1:] if a.lower().endswith(".json")])
@@ -0,0 +1,230 @@
+"""Benchmark senza GUI dei generatori di ostacoli e delle routine di texture.
+
+Uso con FreeCADCmd:
+
+    FreeCADCmd -c "import bench; bench.main()"                # confronta con la baseline
+    FreeCADCmd -c "import bench; bench.main(update=True)"     # registra una nuova baseline
+    FreeCADCmd -c "import bench; bench.main(only='Steps')"    # solo i casi che contengono 'Steps'
+
+Per ogni caso vengono misurati tempo (minimo su `repeat` esecuzioni), crescita
+del picco di memoria del processo, cutter/booleani (brick_utils.stats) e
+facce/solidi del risultato. Le forme sono costruite sempre a livello Export e
+senza cache forme, con la cache dei cutter svuotata prima di ogni caso.
+Ogni caso gira in un proprio processo FreeCADCmd: il picco di memoria è un
+massimo sulla vita del processo, quindi misurato nello stesso processo
+varrebbe zero per tutti i casi dopo il più pesante. Senza FreeCADCmd i casi
+girano qui e la memoria non viene confrontata con la baseline.
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    import FreeCAD as fc  # type: ignore
+    import Part  # type: ignore
+else:
+    try:
+        import FreeCAD as fc
+        import Part
+    except Exception:
+        fc = None
+        Part = None
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+import brick_utils
+import features
+import workers
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+# Soglie di regressione rispetto alla baseline
+TIME_TOLERANCE = 0.25   # +25% di tempo...
+TIME_MIN_DELTA = 0.05   # ...e almeno 50 ms in più
+MEMORY_TOLERANCE = 0.5  # +50% di crescita del picco
+MEMORY_MIN_DELTA = 20 * 1024 # ...e almeno 20 MB (in kB)
+
+# Variazioni rispetto ai valori di default, una alla volta
+OBSTACLE_CASES = {
+    "Kicker": [{}, {"Width": 200}, {"BrickL": 10, "BrickH": 5}, {"Groove": 2.0}],
+    "QuarterPipe": [{}, {"Radius": 200}, {"BrickL": 10, "BrickH": 5}],
+    "Ledge": [{}, {"Length": 300}, {"BrickL": 10, "BrickH": 5}, {"Groove": 2.0}, {"Texture": False},
+              {"Pattern": "Stack"}, {"Pattern": "Herringbone"}, {"Pattern": "Basket"}],
+    "Steps": [{}, {"Steps": 6}, {"BrickL": 10, "BrickH": 5}, {"RailHoles": True}],
+    "Hubba": [{}, {"Length": 300}, {"BrickL": 10, "BrickH": 5}],
+    "Jersey": [{}, {"Texture": True}],
+    "BasePark": [{}, {"Rotate45": True}, {"TileSize": 25}, {"Length": 400, "Width": 300},
+                 {"LargePlaza": True, "Length": 1000, "Width": 800}, {"LargePlaza": True, "Length": 1000, "Width": 800, "PrintTiles": True}],
+}
+
+def _texture_box(engine):
+    box = Part.makeBox(50, 120, 35)
+    return brick_utils.apply_texture(box, 50, 35, 120, 20, 10, 1.2, engine=engine)
+
+def _tiles_plate(engine, rotated):
+    plate = Part.makeBox(200, 150, 8)
+    return brick_utils.apply_horizontal_tiles(plate, 200, 150, 50, 1.0, rotated, engine=engine)
+
+ROUTINE_CASES = {
+    "apply_texture/pattern": lambda: _texture_box("pattern"),
+    "apply_texture/cutters": lambda: _texture_box("cutters"),
+    "apply_horizontal_tiles/pattern": lambda: _tiles_plate("pattern", False),
+    "apply_horizontal_tiles/cutters": lambda: _tiles_plate("cutters", False),
+    "apply_horizontal_tiles/pattern/45": lambda: _tiles_plate("pattern", True),
+}
+
+def _case_id(type_name, params):
+    if not params:
+        return f"{type_name}/default"
+    return type_name + "/" + ",".join(f"{k}={v}" for k, v in sorted(params.items()))
+
+def _peak_kb():
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak # macOS: byte
+
+def measure(build, repeat=3):
+    """Esegue build() `repeat` volte e ritorna le metriche del caso."""
+    times = []
+    peak_before = _peak_kb()
+    shape = None
+    for _ in range(repeat):
+        brick_utils.clear_cutter_cache()
+        brick_utils.reset_stats()
+        t0 = time.perf_counter()
+        shape = build()
+        times.append(time.perf_counter() - t0)
+    valid = shape is not None and not shape.isNull()
+    return {
+        "time": min(times),
+        "memory_kb": _peak_kb() - peak_before,
+        "cutters": brick_utils.stats["cutters"],
+        "tools": brick_utils.stats["tools"],
+        "booleans": brick_utils.stats["booleans"],
+        "failed": brick_utils.stats["failed"],
+        "faces": len(shape.Faces) if valid else 0,
+        "solids": len(shape.Solids) if valid else 0,
+    }
+
+def cases(only=None):
+    """Coppie (id, build) di tutti i casi; build ritorna la forma."""
+    out = []
+    doc = fc.newDocument("FB_Bench")
+    for type_name, variants in OBSTACLE_CASES.items():
+        for params in variants:
+            obj = features.make_obstacle(doc, type_name, features.OBSTACLE_TYPES[type_name])
+            obj.LOD = "Export"
+            for key, value in params.items():
+                setattr(obj, key, value)
+            # build diretto (execute passerebbe dalla cache forme), senza stadi memorizzati
+            def build(obj=obj):
+                obj.Proxy.clear_stages()
+                return obj.Proxy.build(obj)
+            out.append((_case_id(type_name, params), build))
+    out += list(ROUTINE_CASES.items())
+    return doc, [(cid, build) for cid, build in out if only is None or only in cid]
+
+def run_case(cid, repeat, output):
+    """Lato sottoprocesso: misura il solo caso cid e scrive il risultato in output."""
+    doc, todo = cases(cid)
+    try:
+        build = dict(todo)[cid]
+        result = dict(measure(build, repeat), isolated=True)
+    except Exception as e:
+        result = {"error": str(e)}
+    finally:
+        fc.closeDocument(doc.Name)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+def _run_isolated(exe, cid, repeat):
+    fd, output = tempfile.mkstemp(prefix="fbbench_", suffix=".json")
+    os.close(fd)
+    code = f"import sys; sys.path.insert(0, {workers.MODDIR!r}); import bench; bench.run_case({cid!r}, {repeat}, {output!r})"
+    try:
+        subprocess.run([exe, "-c", code], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=workers.JOB_TIMEOUT)
+        with open(output, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError, subprocess.TimeoutExpired) as e:
+        return {"error": f"processo del caso fallito: {e}"}
+    finally:
+        try: os.remove(output)
+        except OSError: pass
+
+def run(only=None, repeat=3, isolate=True):
+    doc, todo = cases(only)
+    exe = workers.freecad_cmd() if isolate else None
+    if isolate and exe is None:
+        fc.Console.PrintWarning("FreeCADCmd non trovato: casi nello stesso processo, memoria non confrontata\n")
+    results = {}
+    try:
+        for cid, build in todo:
+            if exe is not None:
+                results[cid] = _run_isolated(exe, cid, repeat)
+            else:
+                try:
+                    results[cid] = measure(build, repeat)
+                except Exception as e:
+                    results[cid] = {"error": str(e)}
+            r = results[cid]
+            if "error" in r:
+                fc.Console.PrintError(f"{cid}: {r['error']}\n")
+            else:
+                fc.Console.PrintMessage(f"{cid:45} {r['time']*1000:9.1f} ms {r['memory_kb']/1024:7.1f} MB "
+                                        f"{r['cutters']:5} cutter {r['booleans']:3} bool {r['faces']:6} facce {r['solids']:2} solidi\n")
+    finally:
+        fc.closeDocument(doc.Name)
+    return results
+
+def compare(results, baseline):
+    """Ritorna (regressioni, cambi di geometria) come liste di messaggi."""
+    regressions, changes = [], []
+    for cid, r in results.items():
+        old = baseline.get(cid)
+        if old is None or "error" in old:
+            continue
+        if "error" in r:
+            regressions.append(f"{cid}: errore ({r['error']})")
+            continue
+        if r["time"] > old["time"] * (1 + TIME_TOLERANCE) and r["time"] - old["time"] > TIME_MIN_DELTA:
+            regressions.append(f"{cid}: tempo {old['time']*1000:.1f} -> {r['time']*1000:.1f} ms")
+        # Il picco ha senso solo misurato in un processo dedicato al caso
+        if r.get("isolated") and old.get("isolated") and r["memory_kb"] > old["memory_kb"] * (1 + MEMORY_TOLERANCE) and r["memory_kb"] - old["memory_kb"] > MEMORY_MIN_DELTA:
+            regressions.append(f"{cid}: memoria {old['memory_kb']/1024:.1f} -> {r['memory_kb']/1024:.1f} MB")
+        for k in ("cutters", "booleans", "faces", "solids"):
+            if r[k] != old.get(k):
+                changes.append(f"{cid}: {k} {old.get(k)} -> {r[k]}")
+    return regressions, changes
+
+def main(baseline=BASELINE, update=False, only=None, repeat=3, isolate=True):
+    """Esegue il benchmark; con update=True salva i risultati come baseline.
+    Ritorna la lista delle regressioni (vuota se tutto ok)."""
+    results = run(only, repeat, isolate)
+    if update or not os.path.exists(baseline):
+        stored = {}
+        if os.path.exists(baseline):
+            with open(baseline, encoding="utf-8") as f:
+                stored = json.load(f)
+        stored.update(results)
+        with open(baseline, "w", encoding="utf-8") as f:
+            json.dump(stored, f, indent=1, sort_keys=True)
+        fc.Console.PrintMessage(f"Baseline salvata in {baseline}\n")
+        return []
+    with open(baseline, encoding="utf-8") as f:
+        regressions, changes = compare(results, json.load(f))
+    for msg in changes:
+        fc.Console.PrintWarning(f"Geometria cambiata: {msg}\n")
+    for msg in regressions:
+        fc.Console.PrintError(f"Regressione: {msg}\n")
+    if not regressions:
+        fc.Console.PrintMessage("Nessuna regressione\n")
+    return regressions
+
+if __name__ == "__main__":
+    sys.exit(1 if main(update="--update" in sys.argv) else 0)
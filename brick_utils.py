@@ -1,4 +1,5 @@
 import math
+from collections import OrderedDict
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     import FreeCAD as fc  # type: ignore
@@ -19,7 +20,40 @@ else:
         else:
             Part = None
 
-def make_diamond_cutter(length, groove_width, axis='X'):
+import layout
+import profiling
+
+# Cache LRU dei prototipi di cutter: ogni scanalatura diventa un'istanza
+# posizionata di un solido già costruito invece di un nuovo makeBox + rotate.
+# Le istanze condividono la topologia del prototipo (solo la Location cambia),
+# quindi la memoria cresce con le misure diverse di fuga, non con il loro numero.
+# I prototipi non vanno mai modificati sul posto.
+CUTTER_CACHE_SIZE = 64
+_cutter_cache = OrderedDict()
+
+def placed(shape, placement):
+    """Istanza di shape spostata di placement, con la geometria condivisa."""
+    if hasattr(shape, "moved"):
+        return shape.moved(placement)
+    inst = shape.copy() # FreeCAD senza Shape.moved
+    inst.Placement = placement.multiply(inst.Placement)
+    return inst
+
+def _cutter_proto(key, build):
+    proto = _cutter_cache.get(key)
+    if proto is None:
+        proto = build()
+        _cutter_cache[key] = proto
+        if len(_cutter_cache) > CUTTER_CACHE_SIZE:
+            _cutter_cache.popitem(last=False)
+    else:
+        _cutter_cache.move_to_end(key)
+    return proto
+
+def clear_cutter_cache():
+    _cutter_cache.clear()
+
+def _build_diamond_cutter(length, groove_width, axis):
     side = groove_width / math.sqrt(2)
     box = Part.makeBox(length if axis=='X' else side, 
                        length if axis=='Y' else side, 
@@ -35,59 +69,11 @@ def make_diamond_cutter(length, groove_width, axis='X'):
         box.rotate(fc.Vector(0,0,0), fc.Vector(0,0,1), 45)
     return box
 
-def apply_texture(shape, w, h, l, bl, bh, gd, sides=4): 
-    cutters = []
-    rows = int(h / bh) + 1
-    # --- LATI LUNGHI (XZ) - Fiancate ---
-    for y_pos in [0, l]:
-        for r in range(1, rows):
-            z = r * bh
-            if z < h:
-                c = make_diamond_cutter(w + 20, gd, 'X')
-                c.translate(fc.Vector(-10, y_pos, z))
-                cutters.append(c)
-        for r in range(rows):
-            z_s, shift = r * bh, (0 if r % 2 == 0 else bl/2.0)
-            for i in range(int(w/bl) + 2):
-                cv = make_diamond_cutter(bh, gd, 'Z')
-                cv.translate(fc.Vector((i * bl) + shift, y_pos, z_s))
-                cutters.append(cv)
-    # --- RETRO (YZ) ---
-    for r in range(1, rows):
-        z = r * bh
-        if z < h:
-            c = make_diamond_cutter(l + 20, gd, 'Y')
-            c.translate(fc.Vector(w, -10, z))
-            cutters.append(c)
-    for r in range(rows):
-        z_s, shift = r * bh, (0 if r % 2 == 0 else bl/2.0)
-        for i in range(int(l/bl) + 2):
-            cv = make_diamond_cutter(bh, gd, 'Z')
-            cv.translate(fc.Vector(w, (i * bl) + shift, z_s))
-            cutters.append(cv)
-    # --- FRONTE (YZ) - Solo se richiesto ---
-    if sides == 4:
-        for r in range(1, rows):
-            z = r * bh
-            if z < h:
-                c = make_diamond_cutter(l + 20, gd, 'Y')
-                c.translate(fc.Vector(0, -10, z))
-                cutters.append(c)
-        for r in range(rows):
-            z_s, shift = r * bh, (0 if r % 2 == 0 else bl/2.0)
-            for i in range(int(l/bl) + 2):
-                cv = make_diamond_cutter(bh, gd, 'Z')
-                cv.translate(fc.Vector(0, (i * bl) + shift, z_s))
-                cutters.append(cv)
-    if cutters:
-        try:
-            return shape.cut(Part.makeCompound(cutters))
-        except:
-            return shape
-    return shape
+def diamond_proto(length, groove_width, axis='X'):
+    key = ('diamond', round(length, 6), round(groove_width, 6), axis)
+    return _cutter_proto(key, lambda: _build_diamond_cutter(length, groove_width, axis))
 
-def make_rect_cutter(length, width, depth, axis='X'):
-    """Crea un parallelepipedo per scanalature a fondo piatto."""
+def _build_rect_cutter(length, width, depth, axis):
     box = Part.makeBox(length if axis=='X' else width, 
                        length if axis=='Y' else width, 
                        depth) # Profondità fissa in Z
@@ -100,48 +86,267 @@ def make_rect_cutter(length, width, depth, axis='X'):
         box.translate(fc.Vector(-width/2.0, 0, -depth))
     return box
 
-def apply_horizontal_tiles(shape, length, width, tile_size, groove_width, rotated=False, depth=0.5):
-    bbox = shape.BoundBox
-    z_top = bbox.ZMax
-    center_x = length / 2.0
-    center_y = width / 2.0
-    cutters = []
-    
-    # Usiamo il taglio rettangolare (Flat Bottom)
+def rect_proto(length, width, depth, axis='X'):
+    key = ('rect', round(length, 6), round(width, 6), round(depth, 6), axis)
+    return _cutter_proto(key, lambda: _build_rect_cutter(length, width, depth, axis))
+
+# --- SISTEMI DI RIFERIMENTO DELLE FACCE ---
+# Un frame è (origine, asse u, asse v): le fughe vengono costruite nel piano
+# locale XY (u=X, v=Y, normale=Z) e poi portate sulla faccia.
+
+def texture_frames(w, l, sides=4):
+    X, Y, Z = fc.Vector(1,0,0), fc.Vector(0,1,0), fc.Vector(0,0,1)
+    frames = [
+        (fc.Vector(0, 0, 0), X, Z, w), # Fiancata
+        (fc.Vector(0, l, 0), X, Z, w), # Fiancata
+        (fc.Vector(w, 0, 0), Y, Z, l), # Retro
+    ]
+    if sides == 4:
+        frames.append((fc.Vector(0, 0, 0), Y, Z, l)) # Fronte
+    return frames
+
+def frame_placement(origin, u, v):
+    n = u.cross(v)
+    return fc.Placement(fc.Matrix(u.x, v.x, n.x, origin.x,
+                                  u.y, v.y, n.y, origin.y,
+                                  u.z, v.z, n.z, origin.z,
+                                  0, 0, 0, 1))
+
+# --- MOTORE "pattern": una sola rete di fughe per faccia ---
+
+def groove_pattern(segments, groove_width):
+    """Disegna le fughe come un'unica faccia piana (rete di malta) in XY."""
+    hw = groove_width / 2.0
+    faces = []
+    for u0, v0, u1, v1 in segments:
+        if v0 == v1:
+            pts = [(u0, v0-hw), (u1, v0-hw), (u1, v0+hw), (u0, v0+hw)]
+        else:
+            pts = [(u0-hw, v0), (u0+hw, v0), (u0+hw, v1), (u0-hw, v1)]
+        pts = [fc.Vector(x, y, 0) for x, y in pts]
+        faces.append(Part.Face(Part.makePolygon(pts + [pts[0]])))
+    if not faces:
+        return None
+    if len(faces) == 1:
+        return faces[0]
+    return faces[0].multiFuse(faces[1:]).removeSplitter()
+
+def groove_solid(segments, groove_width, below, above=None):
+    """Estrude la rete di fughe in un unico solido da -below a +above lungo Z."""
+    pattern = groove_pattern(segments, groove_width)
+    if pattern is None:
+        return None
+    above = below if above is None else above
+    pattern.translate(fc.Vector(0, 0, -below))
+    return pattern.extrude(fc.Vector(0, 0, below + above))
+
+# --- MOTORE "cutters": un cutter per fuga (metodo originale) ---
+
+def _instances(segments, proto):
+    """Compound di istanze posizionate: proto(lunghezza, asse) dà il prototipo
+    condiviso, cercato una volta per misura anche se la LRU lo scarta."""
+    protos, cutters = {}, []
+    for u0, v0, u1, v1 in segments:
+        key = (round(u1 - u0, 6), 'X') if v0 == v1 else (round(v1 - v0, 6), 'Y')
+        if key not in protos:
+            protos[key] = proto(*key)
+        cutters.append(placed(protos[key], fc.Placement(fc.Vector(u0, v0, 0), fc.Rotation())))
+    return Part.makeCompound(cutters) if cutters else None
+
+def diamond_cutters(segments, groove_width):
+    return _instances(segments, lambda length, axis: diamond_proto(length, groove_width, axis))
+
+def rect_cutters(segments, groove_width, depth):
+    return _instances(segments, lambda length, axis: rect_proto(length, groove_width, depth, axis))
+
+def groove_v_solid(segments, groove_width):
+    """Rete di fughe a V come un unico solido: un prisma a rombo (diagonale
+    groove_width, la stessa sezione dei diamond cutter) per ogni tratto di
+    fughe unite. Dopo merge_collinear i prismi orizzontali non si toccano tra
+    loro, e nemmeno i verticali: basta un solo boolean tra i due compound,
+    invece di fondere centinaia di prismi sovrapposti."""
+    segs = layout.merge_collinear(segments)
+    horiz = layout.horizontal(segs)
+    sets = [diamond_cutters(part, groove_width) for part in (segs[horiz], segs[~horiz])]
+    sets = [tools for tools in sets if tools is not None]
+    if not sets:
+        return None
+    if len(sets) == 1:
+        solids = sets[0].Solids
+        return solids[0] if len(solids) == 1 else sets[0]
+    return sets[0].fuse(sets[1]).removeSplitter()
+
+# "pattern" costruisce un solo solido di fughe per faccia (a V per i mattoni,
+# a fondo piatto per le piastrelle); "cutters" è il vecchio compound di
+# diamanti, usato anche come ripiego. Stessa sezione con entrambi i motori.
+TEXTURE_ENGINE = "pattern"
+# Da incrementare quando cambia la forma delle fughe: invalida la cache forme
+TEXTURE_REVISION = 2
+
+# Callback opzionale per l'avanzamento (es. worker o barra di progresso)
+progress_hook = None
+
+def report(msg):
+    if progress_hook is not None:
+        progress_hook(msg)
+
+# Contatori per benchmark e diagnostica: utensili costruiti, cutter
+# (una fuga = un cutter), operazioni booleane eseguite e fasce fallite.
+stats = {"tools": 0, "cutters": 0, "booleans": 0, "failed": 0}
+
+def reset_stats():
+    for k in stats:
+        stats[k] = 0
+
+# Le fughe vengono tagliate a fasce di righe alte CHUNK_SIZE, una dopo l'altra
+# sul solido intero: serve a isolare i fallimenti (una fascia che fallisce
+# viene ritentata da sola, senza perdere il resto della texture), non a
+# ridurre la dimensione dei boolean, che lavorano sempre su tutto il solido.
+CHUNK_SIZE = 50.0 # mm
+
+def chunk_groups(groups, size=None):
+    """groups: lista di gruppi di facce [(placement, segmenti), ...]. Ritorna
+    le fasce [(gruppo, v0, v1, [(placement, segmenti), ...]), ...]: le facce
+    di un gruppo non si sovrappongono, quindi la stessa fascia di tutte le
+    facce del gruppo va in un solo boolean."""
+    size = CHUNK_SIZE if size is None else size
+    chunks = []
+    for g, group in enumerate(groups):
+        bands = {}
+        for placement, segs in group:
+            for v0, v1, part in layout.bands(segs, size):
+                bands.setdefault((v0, v1), []).append((placement, part))
+        chunks += [(g, v0, v1, faces) for (v0, v1), faces in sorted(bands.items())]
+    return chunks
+
+def _cut_chunk(shape, faces, tool_for):
+    tools = [t for t in (tool_for(pl, segs) for pl, segs in faces) if t is not None]
+    if not tools:
+        return shape
+    stats["booleans"] += 1
+    with profiling.phase("texture.cut"):
+        result = shape.cut(tools[0] if len(tools) == 1 else Part.makeCompound(tools))
+    if result.isNull() or not result.Solids:
+        raise ValueError("il taglio non ha prodotto solidi")
+    return result
+
+def _apply(shape, groups, engine, make_tool, failed=None):
+    """Taglia le fughe fascia per fascia; make_tool(segmenti, engine) crea
+    l'utensile nel piano locale XY e layout identici vengono costruiti una
+    volta sola. Una fascia che fallisce con il motore scelto viene ritentata
+    con i cutter; se fallisce ancora resta liscia e finisce in failed come
+    (gruppo, v0, v1, errore)."""
+    engine = engine or TEXTURE_ENGINE
+    built = {}
+    def tool_for(eng):
+        def placed_tool(placement, segs):
+            key = (eng, layout.as_segments(segs).round(6).tobytes())
+            if key not in built:
+                with profiling.phase("texture.tools"):
+                    built[key] = make_tool(segs, eng) if len(segs) else None
+                stats["tools"] += built[key] is not None
+            stats["cutters"] += len(segs)
+            if built[key] is None:
+                return None
+            return placed(built[key], placement)
+        return placed_tool
+
+    chunks = chunk_groups(groups)
+    for k, (g, v0, v1, faces) in enumerate(chunks):
+        report(f"fughe {k + 1}/{len(chunks)}")
+        for eng in dict.fromkeys((engine, "cutters")):
+            try:
+                shape = _cut_chunk(shape, faces, tool_for(eng))
+                break
+            except Exception as e:
+                error = e
+        else:
+            stats["failed"] += 1
+            if failed is not None:
+                failed.append((g, v0, v1, str(error)))
+    return shape
+
+def apply_brick_faces(shape, groups, gd, engine=None, failed=None):
+    """Taglia le fughe dei mattoni (profondità gd/2) sui gruppi di facce indicati.
+    failed: lista in cui vengono aggiunte le fasce non tagliate."""
+    def make_tool(segs, eng):
+        if eng == "pattern":
+            return groove_v_solid(segs, gd)
+        return diamond_cutters(segs, gd)
+    return _apply(shape, groups, engine, make_tool, failed)
+
+def apply_tile_faces(shape, groups, groove_width, depth, engine=None, failed=None):
+    """Taglia le fughe delle piastrelle (fondo piatto, profondità depth)."""
+    def make_tool(segs, eng):
+        # Taglio rettangolare (Flat Bottom)
+        if eng == "pattern":
+            return groove_solid(segs, groove_width, depth)
+        return rect_cutters(segs, groove_width, depth)
+    return _apply(shape, groups, engine, make_tool, failed)
+
+def texture_groups(w, h, l, bl, bh, sides=4, origin=None, profile=None, pad=0.0, pattern="Running"):
+    """Facce di un blocco w x l x h con l'angolo in origin, già raggruppate:
+    le due fiancate non si toccano, così come retro e fronte. Con profile
+    (bordo superiore delle fiancate, u da 0 a w) le fughe seguono la forma
+    reale e retro/fronte sono alti quanto il profilo in u=w / u=0.
+    pattern: uno di layout.PATTERNS."""
+    origin = origin or fc.Vector(0, 0, 0)
+    faces = []
+    for k, (o, u, v, width) in enumerate(texture_frames(w, l, sides)):
+        if profile is None:
+            segs = layout.brick(pattern, width, h, bl, bh)
+        elif k < 2:
+            segs = layout.clip_to_profile(layout.brick(pattern, width, h, bl, bh), profile, pad)
+        else:
+            top = layout.profile_height(profile, w if k == 2 else 0)
+            segs = layout.brick(pattern, width, top, bl, bh) if top and top > 0 else layout.EMPTY
+        faces.append((frame_placement(origin + o, u, v), segs))
+    return [faces[:2], faces[2:]]
+
+def tile_groups(length, width, tile_size, rotated, z_top, outline=None):
+    """outline: contorni della piastra (section_outline); le fughe vengono
+    tagliate in 2D sulla pianta reale invece di coprire tutta la griglia."""
     if not rotated:
         # Griglia Standard
-        num_y = int(width / tile_size) + 1
-        for i in range(num_y + 1):
-            y_pos = i * tile_size
-            c = make_rect_cutter(length + 10, groove_width, depth, 'X')
-            c.translate(fc.Vector(-5, y_pos, z_top))
-            cutters.append(c)
-            
-        num_x = int(length / tile_size) + 1
-        for i in range(num_x + 1):
-            x_pos = i * tile_size
-            c = make_rect_cutter(width + 10, groove_width, depth, 'Y')
-            c.translate(fc.Vector(x_pos, -5, z_top))
-            cutters.append(c)
+        segs = layout.grid(length, width, tile_size)
+        placement = fc.Placement(fc.Vector(0, 0, z_top), fc.Rotation())
     else:
-        # Griglia Ruotata 45°
-        diag = math.sqrt(length**2 + width**2) + (tile_size * 2)
-        num = int(diag / tile_size) + 2
-        for i in range(num):
-            pos = (i * tile_size) - (diag / 2.0)
-            c1 = make_rect_cutter(diag, groove_width, depth, 'X')
-            c1.translate(fc.Vector(-diag/2.0, pos, 0))
-            cutters.append(c1)
-            c2 = make_rect_cutter(diag, groove_width, depth, 'Y')
-            c2.translate(fc.Vector(pos, -diag/2.0, 0))
-            cutters.append(c2)
-            
-        if cutters:
-            grid = Part.Compound(cutters)
-            grid.rotate(fc.Vector(0,0,0), fc.Vector(0,0,1), 45)
-            grid.translate(fc.Vector(center_x, center_y, z_top))
-            return shape.cut(grid)
-
-    if cutters:
-        shape = shape.cut(Part.Compound(cutters))
-    return shape
\ No newline at end of file
+        # Griglia Ruotata 45° centrata sulla piastra
+        segs = layout.diagonal_grid(length, width, tile_size)
+        placement = fc.Placement(fc.Vector(length / 2.0, width / 2.0, z_top), fc.Rotation(fc.Vector(0,0,1), 45))
+    if outline:
+        inv = placement.inverse()
+        rings = [[(q.x, q.y) for q in (inv.multVec(fc.Vector(x, y, z_top)) for x, y in ring)] for ring in outline]
+        segs = layout.clip_to_outline(segs, rings)
+    return [[(placement, segs)]]
+
+# --- PIANTA REALE DELLE PIASTRE ---
+
+def section_outline(shape, z, pad=0.0):
+    """Contorni della sezione orizzontale di shape a quota z, allargati di pad,
+    come poligoni [(x, y), ...]. None se la sezione non è utilizzabile."""
+    try:
+        wires = shape.slice(fc.Vector(0, 0, 1), z)
+        if pad > 0:
+            wires = [w.makeOffset2D(pad) for w in wires]
+        rings = [[(p.x, p.y) for p in w.discretize(Deflection=0.05)] for w in wires]
+    except Exception:
+        return None
+    return [r for r in rings if len(r) > 2] or None
+
+def groove_lines(groups):
+    """Mezzerie delle fughe in coordinate oggetto (anteprima senza boolean)."""
+    lines = []
+    for group in groups:
+        for placement, segs in group:
+            for u0, v0, u1, v1 in segs:
+                lines.append((placement.multVec(fc.Vector(u0, v0, 0)), placement.multVec(fc.Vector(u1, v1, 0))))
+    return lines
+
+def apply_texture(shape, w, h, l, bl, bh, gd, sides=4, engine=None):
+    return apply_brick_faces(shape, texture_groups(w, h, l, bl, bh, sides), gd, engine)
+
+def apply_horizontal_tiles(shape, length, width, tile_size, groove_width, rotated=False, depth=0.5, engine=None):
+    z_top = shape.BoundBox.ZMax
+    groups = tile_groups(length, width, tile_size, rotated, z_top, section_outline(shape, z_top - depth, groove_width))
+    return apply_tile_faces(shape, groups, groove_width, depth, engine)
@@ -12,31 +12,27 @@ else:
         import FreeCADGui as fcg
         import Part
         import PartDesign
+        from PySide import QtWidgets # type: ignore
     except Exception:
         fc = None
         fcg = None
         Part = None
         PartDesign = None
+        QtWidgets = None
 
-from PySide import QtWidgets # type: ignore
+# Le risorse dei comandi (menu, icone) e la registrazione in FreeCADGui sono
+# in registry.py: questo modulo viene importato solo al primo utilizzo.
 
-ICONDIR = os.path.join(fc.getUserAppDataDir(), "Mod", "FingerboardParkPro", "icons")
-
-def setup_obj(name, cls):
+def setup_obj(name, cls, defaults=None):
     import features
     doc = fc.activeDocument() or fc.newDocument()
-    obj = doc.addObject("Part::FeaturePython", name)
-    cls(obj)
-    if fc.GuiUp:
-        features.ViewProviderFB(obj.ViewObject)
-        obj.ViewObject.Visibility = True
+    obj = features.make_obstacle(doc, name, cls)
+    for prop, value in (defaults or {}).items():
+        setattr(obj, prop, value)
     doc.recompute()
     fcg.SendMsgToActiveView("ViewFit")
 
 class CmdBake:
-    def GetResources(self):
-        return {'MenuText': 'Crea Body', 'Pixmap': os.path.join(ICONDIR, 'FB_Bake.svg')}
-
     def Activated(self):
         selection = fcg.Selection.getSelection()
         if not selection: return
@@ -53,83 +49,106 @@ class CmdBake:
 
         doc.recompute()
 
-class CmdKicker:
-    def GetResources(self): return {'MenuText': 'Kicker', 'Pixmap': os.path.join(ICONDIR, 'FB_Kicker.svg')}
-    def Activated(self): 
-        import features
-        setup_obj("Kicker", features.FB_Kicker)
-
-class CmdQP:
-    def GetResources(self): return {'MenuText': 'QuarterPipe', 'Pixmap': os.path.join(ICONDIR, 'FB_QP.svg')}
-    def Activated(self): 
-        import features
-        setup_obj("QuarterPipe", features.FB_QuarterPipe)
-
-class CmdLedge:
-    def GetResources(self): return {'MenuText': 'Ledge', 'Pixmap': os.path.join(ICONDIR, 'FB_Ledge.svg')}
-    def Activated(self): 
-        import features
-        setup_obj("Ledge", features.FB_Ledge)
-
-class CmdSteps:
-    def GetResources(self): return {'MenuText': 'Gradini', 'Pixmap': os.path.join(ICONDIR, 'FB_Steps.svg')}
-    def Activated(self): 
-        import features
-        setup_obj("Steps", features.FB_Steps)
-
-class CmdHubba:
-    def GetResources(self): return {'MenuText': 'Hubba', 'Pixmap': os.path.join(ICONDIR, 'FB_Hubba.svg')}
-    def Activated(self): 
+class CmdTextureToggle:
+    def Activated(self):
         import features
-        setup_obj("Hubba", features.FB_Hubba)
+        doc = fc.activeDocument()
+        if not doc: return
+        
+        import background
+        levels = features.LOD_LEVELS
+        new_level = levels[(levels.index(features.document_lod(doc)) + 1) % len(levels)]
+        if background.apply_lod(doc, new_level):
+            fc.Console.PrintMessage(f"Livello di dettaglio: {new_level}.\n")
+        else:
+            fc.Console.PrintMessage("Cambio livello di dettaglio annullato.\n")
+
+class CmdRecomputePark:
+    def Activated(self):
+        import workers
+        doc = fc.activeDocument()
+        if not doc: return
+        for obj in doc.Objects:
+            if workers.is_obstacle(obj): obj.touch()
+        workers.recompute_parallel(doc)
+        fc.Console.PrintMessage("Parco ricalcolato.\n")
 
-class CmdJersey:
-    def GetResources(self): return {'MenuText': 'Jersey', 'Pixmap': os.path.join(ICONDIR, 'FB_Jersey.svg')}
-    def Activated(self): 
+class CmdProfile:
+    def Activated(self):
         import features
-        setup_obj("Jersey", features.FB_Jersey)
+        import profiling
+        doc = fc.activeDocument()
+        if not doc: return
+        objs = [o for o in fcg.Selection.getSelection() if o in features.obstacles(doc)] or features.obstacles(doc)
+        if not objs: return
+        profiling.profile_recompute(doc, objs)
 
-class CmdBase:
-    def GetResources(self): return {'MenuText': 'Pavimento', 'Pixmap': os.path.join(ICONDIR, 'FB_Base.svg')}
-    def Activated(self): 
+class CmdExportPark:
+    def Activated(self):
+        import background
+        import export
         import features
-        setup_obj("BasePark", features.FB_Base)
-
-class CmdTextureToggle:
-    def GetResources(self):
-        return {
-            'MenuText': 'Attiva/Disattiva Texture',
-            'Pixmap': os.path.join(ICONDIR, 'FB_TextureToggle.svg'),
-            'ToolTip': 'Spegne o accende le texture (rispetta il LockTexture)'
-        }
-
+        doc = fc.activeDocument()
+        if not doc: return
+        objs = [o for o in fcg.Selection.getSelection() if o in export.exportable(doc)] or export.exportable(doc)
+        if not objs: return
+        mesh_texture = export.mesh_texture_pref()
+        if not mesh_texture and features.document_lod(doc) != "Export" and any(features.texture_level(o) != "Export" for o in objs if o in features.obstacles(doc)):
+            answer = QtWidgets.QMessageBox.question(None, "Esporta STL", "Alcuni ostacoli non sono a livello Export (texture reale). Passare a Export prima di esportare?",
+                                                    QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No | QtWidgets.QMessageBox.Cancel)
+            if answer == QtWidgets.QMessageBox.Cancel: return
+            if answer == QtWidgets.QMessageBox.Yes and not background.apply_lod(doc, "Export"): return
+        params = fc.ParamGet("User parameter:BaseApp/Preferences/Mod/FingerboardParkPro")
+        deflection, ok = QtWidgets.QInputDialog.getDouble(None, "Esporta STL", "Deflessione (mm):", export.deflection_pref(), 0.001, 10.0, 3)
+        if not ok: return
+        params.SetFloat("ExportDeflection", deflection)
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(None, "Esporta STL", os.path.join(os.path.dirname(doc.FileName or ""), doc.Label + ".stl"), "STL (*.stl)")
+        if not path: return
+        count = background.export_stl(doc, path, deflection, objs, mesh_texture)
+        if count is None:
+            fc.Console.PrintMessage("Esportazione annullata.\n")
+        else:
+            fc.Console.PrintMessage(f"{len(objs)} oggetti, {count} triangoli esportati in {path}\n")
+
+class CmdMerge:
     def Activated(self):
+        import background
+        import export
+        import profiling
         doc = fc.activeDocument()
         if not doc: return
-        
-        # Determiniamo il nuovo stato basandoci sul primo oggetto non bloccato
-        new_state = None
-        for obj in doc.Objects:
-            if hasattr(obj, "Texture") and not getattr(obj, "LockTexture", False):
-                if new_state is None:
-                    new_state = not obj.Texture
-                obj.Texture = new_state
-        
+        # Solo ostacoli e parti visibili: i piani di split non vanno fusi
+        candidates = export.exportable(doc)
+        objs = [o for o in fcg.Selection.getSelection() if o in candidates] or candidates
+        if len(objs) < 2: return
+        if profiling.enabled():
+            with profiling.session() as timings:
+                result = background.merge_objects(objs)
+            fc.Console.PrintMessage(f"Profilo unione: {profiling.format_timings(timings)}\n")
+        else:
+            result = background.merge_objects(objs)
+        if result is None:
+            fc.Console.PrintMessage("Unione annullata\n")
+            return
+        groups, fused = result
+        doc.openTransaction("Unisci")
+        count = 0
+        for group, shape in zip(groups, fused):
+            if len(group) < 2: continue
+            count += 1
+            obj = doc.addObject("Part::Feature", "Merged")
+            obj.Label = "Merged_" + group[0].Label
+            obj.Shape = shape
+            for o in group:
+                o.ViewObject.Visibility = False
         doc.recompute()
-        fc.Console.PrintMessage(f"Texture globali aggiornate (oggetti bloccati ignorati).\n")
+        doc.commitTransaction()
+        fc.Console.PrintMessage(f"Unione eseguita: {count} solidi da {sum(len(g) for g in groups if len(g) > 1)} oggetti, {sum(len(g) == 1 for g in groups)} oggetti isolati lasciati separati\n")
 
 class CmdCreateSplitProxy:
-    def GetResources(self):
-        return {
-            'MenuText': '1. Crea Piano con Mirino',
-            'Pixmap': os.path.join(ICONDIR, 'FB_Proxy.svg'),
-            'ToolTip': 'Il centro della croce indica dove nascerà il perno'
-        }
-
     def Activated(self):
+        # I proxy esistenti restano: con più piani selezionati lo split è multiplo
         doc = fc.activeDocument() or fc.newDocument()
-        for o in doc.Objects:
-            if "SplitProxy" in o.Name: doc.removeObject(o.Name)
             
         # --- CREAZIONE PROXY CON MIRINO ---
         size = 150.0
@@ -158,83 +177,102 @@ class CmdCreateSplitProxy:
         
         fc.Console.PrintMessage("Posiziona il centro della croce dove vuoi l'incastro.\n")
 
-class CmdConfirmSplit:
-    def GetResources(self):
-        return {
-            'MenuText': '2. Conferma Split',
-            'Pixmap': os.path.join(ICONDIR, 'FB_SplitConfirm.svg'),
-            'ToolTip': 'Taglia e inserisce il perno esattamente al centro del mirino'
-        }
+def run_split(target, placements, proxies=()):
+    """Divide target con i piani dati e aggiunge i pezzi in un'unica transazione."""
+    import background
+    import profiling
+    doc = fc.activeDocument()
+    if profiling.enabled():
+        with profiling.session() as timings:
+            pieces = background.split_target(target, placements)
+        fc.Console.PrintMessage(f"Profilo split: {profiling.format_timings(timings)}\n")
+    else:
+        pieces = background.split_target(target, placements)
+    if pieces is None:
+        fc.Console.PrintMessage("Split annullato\n")
+        return
+
+    # Applicazione dei risultati in un'unica transazione
+    doc.openTransaction("Split")
+    for i, piece in enumerate(pieces):
+        suffix = chr(ord("A") + i) if i < 26 else str(i + 1)
+        obj = doc.addObject("Part::Feature", f"{target.Name}_Part_{suffix}")
+        obj.Shape = piece
+
+    # Pulizia
+    for proxy in proxies:
+        doc.removeObject(proxy.Name)
+    target.ViewObject.Visibility = False
+    doc.recompute()
+    doc.commitTransaction()
+    fc.Console.PrintMessage(f"Split eseguito: {len(pieces)} pezzi\n")
 
+class CmdConfirmSplit:
     def Activated(self):
         selection = fcg.Selection.getSelection()
-        proxy = None
+        proxies = []
         target = None
 
         for s in selection:
-            if "SplitProxy" in s.Name: proxy = s
+            if "SplitProxy" in s.Name: proxies.append(s)
             elif hasattr(s, "Shape") and not "SplitProxy" in s.Name: target = s
 
-        if not proxy or not target:
+        if not proxies or not target:
             QtWidgets.QMessageBox.warning(None, "Split", "Seleziona l'ostacolo e il piano con la croce!")
             return
 
-        doc = fc.activeDocument()
-        
-        # 1. Volume di taglio basato sul piano del Proxy
-        bbox = target.Shape.BoundBox
-        c_size = max(bbox.XLength, bbox.YLength, bbox.ZLength) * 2
-        
-        cutter_vol = Part.makeBox(c_size, c_size, c_size)
-        cutter_vol.Placement = proxy.Placement
-        # Spostiamo il volume in modo che la faccia coincida con lo 0 del proxy
-        cutter_vol.translate(proxy.Placement.Rotation.multVec(fc.Vector(-c_size, -c_size/2, -c_size/2)))
-
-        part_a = target.Shape.common(cutter_vol)
-        part_b = target.Shape.cut(cutter_vol)
-
-        # 2. Creazione Giunti Smussati (Joints)
-        tol = 0.2 # Tolleranza per il taglio
-        jw, jl, jh = 5.0, 3.0, 30.0 # Dimensioni fisse del giunto
-        ch = 1.5 # Smusso
-
-        def make_joint(w, l, h, c, t=0):
-            # Crea il box centrato sul suo 0,0,0
-            j = Part.makeBox(l + t, w + t, h + t)
-            j.translate(fc.Vector(-(l+t)/2, -(w+t)/2, -(h+t)/2))
-            if c > 0: j = j.makeChamfer(c, j.Edges)
-            return j
-
-        pin = make_joint(jw, jl, jh, ch)
-        hole = make_joint(jw, jl, jh, ch, tol)
-
-        # Il perno prende ESATTAMENTE il placement del proxy. 
-        # Siccome il perno è creato centrato e il mirino è al centro del proxy,
-        # l'allineamento è matematicamente perfetto.
-        pin.Placement = proxy.Placement
-        hole.Placement = proxy.Placement
-
-        # 3. Operazioni finali
-        obj_a = doc.addObject("Part::Feature", target.Name + "_Part_A")
-        obj_a.Shape = part_a.fuse(pin)
-        
-        obj_b = doc.addObject("Part::Feature", target.Name + "_Part_B")
-        obj_b.Shape = part_b.cut(hole)
+        run_split(target, [p.Placement for p in proxies], proxies)
 
-        # Pulizia
-        doc.removeObject(proxy.Name)
-        target.ViewObject.Visibility = False
-        doc.recompute()
-        fc.Console.PrintMessage("Split eseguito\n")
-
-fcg.addCommand('FB_Proxy', CmdCreateSplitProxy())
-fcg.addCommand('FB_SplitConfirm', CmdConfirmSplit())
-fcg.addCommand('FB_TextureToggle', CmdTextureToggle())
-fcg.addCommand('FB_Hubba', CmdHubba())
-fcg.addCommand('FB_Bake', CmdBake())
-fcg.addCommand('FB_Kicker', CmdKicker())
-fcg.addCommand('FB_QP', CmdQP())
-fcg.addCommand('FB_Ledge', CmdLedge())
-fcg.addCommand('FB_Steps', CmdSteps())
-fcg.addCommand('FB_Jersey', CmdJersey())
-fcg.addCommand('FB_Base', CmdBase())
\ No newline at end of file
+class CmdAutoSplit:
+    def Activated(self):
+        selection = [s for s in fcg.Selection.getSelection() if hasattr(s, "Shape")]
+        if len(selection) != 1:
+            QtWidgets.QMessageBox.warning(None, "Split", "Seleziona un solo ostacolo!")
+            return
+        import features
+        import split
+        params = fc.ParamGet("User parameter:BaseApp/Preferences/Mod/FingerboardParkPro")
+        text, ok = QtWidgets.QInputDialog.getText(None, "Split per Piatto", "Volume di stampa X,Y,Z (mm):", text=params.GetString("BedSize", "220,220,250"))
+        if not ok: return
+        try:
+            bed = [float(v) for v in text.split(",")]
+            if len(bed) != 3: raise ValueError
+        except ValueError:
+            QtWidgets.QMessageBox.warning(None, "Split", "Formato: tre numeri, es. 220,220,250")
+            return
+        params.SetString("BedSize", text)
+
+        target = selection[0]
+        lines = []
+        if isinstance(getattr(target, "Proxy", None), features.FB_Feature):
+            pl = target.Placement
+            lines = [(pl.multVec(p0), pl.multVec(p1)) for p0, p1 in target.Proxy.groove_lines(target)]
+        try:
+            placements = split.plan_cuts(target.Shape, bed, lines)
+        except ValueError as e:
+            QtWidgets.QMessageBox.warning(None, "Split", str(e))
+            return
+        if not placements:
+            fc.Console.PrintMessage(f"{target.Label} entra già nel piatto.\n")
+            return
+        fc.Console.PrintMessage(f"{target.Label}: {len(placements)} tagli pianificati\n")
+        run_split(target, placements)
+
+class CmdGridSplit:
+    def Activated(self):
+        selection = [s for s in fcg.Selection.getSelection() if hasattr(s, "Shape")]
+        if len(selection) != 1:
+            QtWidgets.QMessageBox.warning(None, "Split", "Seleziona un solo ostacolo!")
+            return
+        text, ok = QtWidgets.QInputDialog.getText(None, "Split a Griglia", "Pezzi lungo X,Y,Z:", text="2,1,1")
+        if not ok: return
+        try:
+            counts = [max(1, int(v)) for v in text.split(",")]
+        except ValueError:
+            QtWidgets.QMessageBox.warning(None, "Split", "Formato: tre numeri interi, es. 2,3,1")
+            return
+        import split
+        target = selection[0]
+        placements = split.grid_placements(target.Shape.BoundBox, *counts[:3])
+        if not placements: return
+        run_split(target, placements)
@@ -0,0 +1,107 @@
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    import FreeCAD as fc  # type: ignore
+    import MeshPart  # type: ignore
+else:
+    try:
+        import FreeCAD as fc
+        import MeshPart
+    except Exception:
+        fc = None
+        MeshPart = None
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import profiling
+
+# Texture a spostamento di mesh: invece dei boolean sul B-rep, l'ostacolo
+# senza fughe viene tessellato fine e i vertici che cadono su una fuga vengono
+# spinti dentro il solido. Le fughe sono le stesse della texture reale
+# (groove_layout della build Preview), con profilo a V per i mattoni e a fondo
+# piatto per le piastrelle. Serve solo per l'STL: nel documento nulla cambia.
+
+EDGE_FACTOR = 0.5 # Lato massimo dei triangoli, in frazioni della larghezza della fuga
+PLANE_TOL = 1e-3  # mm, distanza entro cui un vertice sta sul piano della faccia
+INSIDE_STEP = 0.05 # mm, passo per capire da che parte sta il materiale
+BLOCK = 4096 # Vertici elaborati insieme (limita la memoria delle matrici distanza)
+
+def available():
+    return np is not None and MeshPart is not None
+
+def mesh_arrays(shape, max_length):
+    """Tessellazione isotropa (lato <= max_length) come array di punti e facce."""
+    with profiling.phase("mesh"):
+        mesh = MeshPart.meshFromShape(Shape=shape, MaxLength=max_length)
+        points, facets = mesh.Topology
+    return np.array([(p.x, p.y, p.z) for p in points], dtype=np.float64), np.array(facets, dtype=np.int64)
+
+def groove_distance(uv, segments):
+    """Distanza di ogni punto (u, v) dalla mezzeria della fuga più vicina che
+    lo copre lungo la sua direzione (inf se nessuna)."""
+    seg = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+    horiz = seg[:, 1] == seg[:, 3]
+    best = np.full(len(uv), np.inf)
+    for along, across, rows in ((0, 1, seg[horiz]), (1, 0, seg[~horiz])):
+        if not len(rows):
+            continue
+        lo = np.minimum(rows[:, along], rows[:, along + 2])
+        hi = np.maximum(rows[:, along], rows[:, along + 2])
+        line = rows[:, across]
+        for start in range(0, len(uv), BLOCK):
+            a = uv[start:start + BLOCK, along, None]
+            c = uv[start:start + BLOCK, across, None]
+            d = np.where((a >= lo) & (a <= hi), np.abs(c - line), np.inf)
+            best[start:start + BLOCK] = np.minimum(best[start:start + BLOCK], d.min(axis=1))
+    return best
+
+def depth_profile(kind, dist, width, depth):
+    hw = width / 2.0
+    if kind == "V":
+        return depth * np.clip(1.0 - dist / hw, 0.0, 1.0)
+    return np.where(dist <= hw, depth, 0.0)
+
+def _outward(shape, placement, points):
+    """Normale della faccia (asse Z del frame) rivolta verso l'esterno."""
+    n = placement.Rotation.multVec(fc.Vector(0, 0, 1))
+    centre = points.mean(axis=0)
+    p = points[np.argmin(((points - centre) ** 2).sum(axis=1))]
+    probe = fc.Vector(*p) - n * INSIDE_STEP
+    return n if shape.isInside(probe, PLANE_TOL, False) else -n
+
+def stamp(points, shape, grooves):
+    """Sposta sul posto i vertici di points (n x 3) che cadono sulle fughe."""
+    with profiling.phase("stamp"):
+        for kind, groups, width, depth in grooves:
+            for group in groups:
+                for placement, segs in group:
+                    if not len(segs):
+                        continue
+                    m = placement.inverse().toMatrix()
+                    rot = np.array([[m.A11, m.A12, m.A13], [m.A21, m.A22, m.A23], [m.A31, m.A32, m.A33]])
+                    local = points @ rot.T + np.array([m.A14, m.A24, m.A34])
+                    idx = np.nonzero(np.abs(local[:, 2]) < PLANE_TOL)[0]
+                    if not len(idx):
+                        continue
+                    amount = depth_profile(kind, groove_distance(local[idx, :2], segs), width, depth)
+                    hit = amount > 0
+                    if not hit.any():
+                        continue
+                    n = _outward(shape, placement, points[idx])
+                    points[idx[hit]] -= np.outer(amount[hit], (n.x, n.y, n.z))
+
+def textured_mesh(obj, deflection=0.05):
+    """(punti, facce) dell'ostacolo con le fughe stampate sulla mesh, in
+    coordinate locali. Nessun boolean: la forma è quella della build Preview."""
+    shape, _, grooves = obj.Proxy.groove_layout(obj)
+    widths = [width for _, _, width, _ in grooves]
+    edge = EDGE_FACTOR * min(widths) if widths else None
+    if edge is None:
+        # Nessuna fuga: basta una tessellazione normale
+        with profiling.phase("mesh"):
+            pts, facets = shape.tessellate(deflection)
+        return np.array([(p.x, p.y, p.z) for p in pts], dtype=np.float64), np.array(facets, dtype=np.int64)
+    points, facets = mesh_arrays(shape, edge)
+    stamp(points, shape, grooves)
+    return points, facets
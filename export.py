@@ -0,0 +1,158 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    import FreeCAD as fc  # type: ignore
+else:
+    try:
+        import FreeCAD as fc
+    except Exception:
+        fc = None
+
+import displace
+import features
+import shape_cache
+import stl
+import workers
+
+# Esportazione STL del parco. Ogni oggetto viene tessellato in coordinate
+# locali e la mesh salvata come STL binario nella cache (chiave: forma +
+# deflessione), così una riesportazione senza modifiche non ritessella nulla.
+# Le mesh mancanti vengono calcolate in parallelo nei worker; il file finale
+# è scritto un oggetto alla volta applicando il Placement ai triangoli.
+
+MESH_MAX_ENTRIES = 500
+DEFAULT_DEFLECTION = 0.05
+
+def deflection_pref():
+    return fc.ParamGet(shape_cache.PARAM_PATH).GetFloat("ExportDeflection", DEFAULT_DEFLECTION)
+
+def mesh_texture_pref():
+    """Fughe stampate sulla mesh (displace) invece dei boolean sul B-rep."""
+    return fc.ParamGet(shape_cache.PARAM_PATH).GetBool("MeshTexture", False) and displace.available()
+
+def mesh_dir():
+    path = os.path.join(os.path.dirname(shape_cache.cache_dir()), "meshes")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def local_shape(obj):
+    shape = obj.Shape.copy()
+    shape.Placement = fc.Placement()
+    return shape
+
+def mesh_key(obj, deflection, displaced=False):
+    """Chiave della mesh: per gli ostacoli quella della cache forme più il
+    livello di dettaglio (o il metodo di texture se displaced) e TextureStatus,
+    così la mesh di una texture incompleta non viene riusata dopo un ricalcolo
+    riuscito; per gli altri oggetti l'hash del BREP locale."""
+    if displaced:
+        ident = f"{shape_cache.shape_key(obj)}displace{displace.EDGE_FACTOR}"
+    elif workers.is_obstacle(obj):
+        ident = shape_cache.shape_key(obj) + features.texture_level(obj) + getattr(obj, "TextureStatus", "OK")
+    else:
+        ident = local_shape(obj).exportBrepToString()
+    return hashlib.sha1(f"{shape_cache.VERSION}|{deflection!r}|{ident}".encode("utf-8")).hexdigest()
+
+def mesh_path(key):
+    return os.path.join(mesh_dir(), key + ".stl")
+
+def is_split_proxy(obj):
+    return "SplitProxy" in obj.Name
+
+def exportable(doc):
+    """Oggetti visibili con almeno un solido, esclusi i piani di split
+    (rigenerando prima le forme non salvate ancora in coda)."""
+    features.flush_pending(doc)
+    return [o for o in doc.Objects
+            if o.isDerivedFrom("Part::Feature") and o.Visibility and not is_split_proxy(o)
+            and not o.Shape.isNull() and o.Shape.Solids]
+
+def _store(src, path):
+    tmp = path + ".tmp"
+    shutil.move(src, tmp)
+    os.replace(tmp, path)
+
+def tessellate(obj, path, deflection):
+    """Tessella l'oggetto in locale e salva la mesh in cache."""
+    tmp = path + ".part"
+    stl.write_shape(tmp, local_shape(obj), deflection)
+    os.replace(tmp, path)
+
+def tessellate_displaced(obj, path, deflection):
+    """Mesh dell'ostacolo senza fughe con le fughe stampate sui vertici."""
+    points, facets = displace.textured_mesh(obj, deflection)
+    tmp = path + ".part"
+    with stl.StlWriter(tmp) as writer:
+        writer.add_triangles(points, facets)
+    os.replace(tmp, path)
+
+def tessellate_parallel(pending, deflection, run=None):
+    """Calcola nei worker le mesh mancanti [(oggetto, percorso)]. Ritorna le
+    coppie rimaste da fare in serie (worker assenti o falliti). run è la
+    funzione che esegue i job (default workers.run_jobs, la GUI passa quella
+    con la barra di avanzamento) e può sollevare workers.Cancelled."""
+    if len(pending) < 2 or not workers.parallel_enabled():
+        return pending
+    run = run or workers.run_jobs
+    done = set()
+    workdir = tempfile.mkdtemp(prefix="fbmesh_")
+    try:
+        jobs = []
+        for i, (obj, _) in enumerate(pending):
+            brep = os.path.join(workdir, f"in{i}.brep")
+            local_shape(obj).exportBrep(brep)
+            jobs.append({"task": "tessellate", "label": obj.Label, "input": brep,
+                         "deflection": deflection, "ext": "stl"})
+        def on_done(i, job):
+            if job is not None:
+                _store(job["output"], pending[i][1])
+                done.add(i)
+        run(jobs, on_done)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return [p for i, p in enumerate(pending) if i not in done]
+
+def _prune():
+    folder = mesh_dir()
+    files = [os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(".stl")]
+    if len(files) <= MESH_MAX_ENTRIES:
+        return
+    files.sort(key=os.path.getmtime)
+    for f in files[:len(files) - MESH_MAX_ENTRIES]:
+        try: os.remove(f)
+        except OSError: pass
+
+def export_park(doc, path, deflection=None, objs=None, run=None, report=None, mesh_texture=None):
+    """Esporta objs (default: tutti gli oggetti visibili) in un unico STL
+    binario. Con mesh_texture (default: preferenza MeshTexture) le fughe degli
+    ostacoli sono stampate sulla mesh, a qualunque livello di dettaglio.
+    Ritorna il numero di triangoli scritti."""
+    deflection = deflection_pref() if deflection is None else deflection
+    objs = exportable(doc) if objs is None else objs
+    mesh_texture = mesh_texture_pref() if mesh_texture is None else mesh_texture and displace.available()
+    displaced = {o.Name for o in objs if mesh_texture and workers.is_obstacle(o)}
+    paths = [mesh_path(mesh_key(o, deflection, o.Name in displaced)) for o in objs]
+    # Ostacoli identici hanno la stessa chiave: una sola tessellazione
+    pending = list({p: (o, p) for o, p in zip(objs, paths) if not os.path.exists(p)}.values())
+    stamped = [(o, p) for o, p in pending if o.Name in displaced]
+    pending = [(o, p) for o, p in pending if o.Name not in displaced]
+    if pending:
+        pending = tessellate_parallel(pending, deflection, run)
+    for obj, p in pending:
+        if report:
+            report(f"{obj.Label}: tessellazione")
+        tessellate(obj, p, deflection)
+    for obj, p in stamped:
+        if report:
+            report(f"{obj.Label}: fughe sulla mesh")
+        tessellate_displaced(obj, p, deflection)
+    # Scrittura in streaming: in memoria c'è la mesh di un solo oggetto
+    with stl.StlWriter(path) as writer:
+        for obj, p in zip(objs, paths):
+            writer.add_records(stl.read_records(p), obj.Shape.Placement)
+            os.utime(p)
+    _prune()
+    return writer.count
@@ -28,6 +28,7 @@ except Exception:
     Part = _PartStub()
 
 import math
+from collections import OrderedDict
 
 try:
     import brick_utils
@@ -39,12 +40,363 @@ except Exception:
             return shape
     brick_utils = _BrickUtilsStub()
 
+import layout
+import profiling
+import registry
+import shape_cache
+
+# --- LIVELLO DI DETTAGLIO (LOD) ---
+# Block-out: solo solidi; Preview: fughe disegnate come linee (nessun boolean);
+# Export: fughe reali. Il livello di documento vale per gli oggetti in "Auto".
+LOD_LEVELS = ["Block-out", "Preview", "Export"]
+DEFAULT_LOD = "Preview"
+LOD_META_KEY = "FingerboardParkPro_LOD"
+
+def document_lod(doc):
+    level = doc.Meta.get(LOD_META_KEY) if doc is not None else None
+    return level if level in LOD_LEVELS else DEFAULT_LOD
+
+def texture_level(fp):
+    forced = getattr(getattr(fp, "Proxy", None), "_forced_level", None)
+    if forced:
+        return forced
+    lod = getattr(fp, "LOD", "Auto")
+    if lod != "Auto":
+        return lod
+    # LockTexture: l'oggetto resta texturizzato qualunque sia il livello del documento
+    if getattr(fp, "LockTexture", False):
+        return "Export"
+    return document_lod(fp.Document)
+
+def obstacles(doc):
+    return [o for o in doc.Objects if isinstance(getattr(o, "Proxy", None), FB_Feature)]
+
+def has_texture(fp):
+    """Senza texture (Texture / Tiles spenti) la forma è uguale a ogni livello."""
+    return getattr(fp, "Texture", getattr(fp, "Tiles", False))
+
+def lod_changes(doc, level):
+    """Oggetti la cui forma cambierebbe passando il documento a level."""
+    if document_lod(doc) == level:
+        return []
+    return [o for o in obstacles(doc) if getattr(o, "LOD", "Auto") == "Auto" and not getattr(o, "LockTexture", False) and has_texture(o)]
+
+def set_document_lod(doc, level):
+    """Imposta il livello di documento e marca da ricalcolare solo gli oggetti
+    il cui livello effettivo cambia. Ritorna gli oggetti toccati."""
+    changed = lod_changes(doc, level)
+    meta = doc.Meta
+    meta[LOD_META_KEY] = level
+    doc.Meta = meta
+    for o in changed:
+        o.touch()
+    return changed
+
+# --- ISTANZE ---
+# Ostacoli con le stesse proprietà geometriche allo stesso livello vengono
+# calcolati una volta sola: gli altri ricevono la stessa forma (e le stesse
+# linee di anteprima), che FreeCAD posiziona con il Placement di ciascuno.
+# La forma condivisa porta con sé anche la tessellazione per la vista 3D.
+INSTANCE_SIZE = 32
+_instances = OrderedDict()
+
+def instance_key(fp):
+    return shape_cache.shape_key(fp), texture_level(fp)
+
+def _shared(key):
+    hit = _instances.get(key)
+    if hit is not None:
+        _instances.move_to_end(key)
+    return hit
+
+def _share(key, shape, lines):
+    _instances[key] = (shape, lines)
+    _instances.move_to_end(key)
+    while len(_instances) > INSTANCE_SIZE:
+        _instances.popitem(last=False)
+
+def clear_instances():
+    _instances.clear()
+
+# --- SALVATAGGIO SOLO PARAMETRI ---
+# Con StoreShape = False la forma è Transient: nel .FCStd finiscono solo le
+# proprietà e ShapeFingerprint (chiave forma + livello). All'apertura le forme
+# vengono rigenerate in idle, prima gli oggetti visibili, dalla cache forme
+# quando possibile. Senza GUI vengono rigenerate tutte a fine apertura.
+_pending = {} # nome documento -> oggetti da rigenerare
+_observer = None
+
+def store_shapes_pref():
+    return fc.ParamGet(shape_cache.PARAM_PATH).GetBool("StoreShapes", True)
+
+def fingerprint(key):
+    return "|".join(key)
+
+def apply_storage(fp):
+    fp.setPropertyStatus("Shape", "-Transient" if fp.StoreShape else "Transient")
+
+def regenerate(fp):
+    """Ricostruisce la forma non salvata senza ricalcolare il documento.
+    Fuori dal recompute l'assegnazione di Shape riporterebbe il Placement
+    dell'oggetto a quello (identità) della forma: va ripristinato."""
+    saved, placement = fp.ShapeFingerprint, fp.Placement
+    fp.Proxy._execute(fp)
+    fp.Placement = placement
+    fp.purgeTouched()
+    if saved and saved != fp.ShapeFingerprint:
+        fc.Console.PrintWarning(f"{fp.Label}: impronta diversa da quella salvata (versione o motore texture cambiati)\n")
+
+class _RestoreObserver:
+    """Avvia la rigenerazione a documento caricato: durante onDocumentRestored
+    le altre proprietà possono mancare e i touch() verrebbero azzerati."""
+    def slotFinishRestoreDocument(self, doc):
+        if doc.Name not in _pending:
+            return
+        if not fc.GuiUp:
+            flush_pending(doc)
+            return
+        from PySide import QtCore # type: ignore
+        QtCore.QTimer.singleShot(0, lambda: _regenerate_next(doc.Name))
+
+def _queue(fp):
+    global _observer
+    if _observer is None:
+        _observer = _RestoreObserver()
+        fc.addDocumentObserver(_observer)
+    _pending.setdefault(fp.Document.Name, []).append(fp)
+
+def _regenerate_next(doc_name):
+    """Un oggetto per giro di event loop: la GUI resta reattiva durante l'apertura."""
+    queue = _pending.get(doc_name)
+    if not queue or doc_name not in fc.listDocuments():
+        _pending.pop(doc_name, None)
+        return
+    queue.sort(key=lambda o: not o.Visibility)
+    fp = queue.pop(0)
+    try:
+        regenerate(fp)
+    except Exception as e:
+        fc.Console.PrintError(f"{fp.Label}: rigenerazione fallita: {e}\n")
+    from PySide import QtCore # type: ignore
+    QtCore.QTimer.singleShot(0, lambda: _regenerate_next(doc_name))
+
+def flush_pending(doc):
+    """Rigenera subito le forme ancora in coda (prima di esportare o unire)."""
+    for fp in _pending.pop(doc.Name, []):
+        regenerate(fp)
+
+def failure_report(failed):
+    """Testo di TextureStatus: fasce di fughe (gruppo di facce, quote lungo la
+    faccia) rimaste senza taglio."""
+    if not failed:
+        return "OK"
+    zones = ", ".join(f"facce {g + 1} {v0:.0f}-{v1:.0f} mm" for g, v0, v1, _ in failed)
+    return f"{len(failed)} fasce senza fughe: {zones} ({failed[0][3]})"
+
+# Segmenti con cui il profilo della transizione viene approssimato per le fughe
+ARC_SEGMENTS = 24
+
 class ViewProviderFB:
     def __init__(self, vobj): vobj.Proxy = self
     def getIcon(self): return ""
     def getDefaultDisplayMode(self): return "Shaded"
 
-class FB_Ledge:
+    def attach(self, vobj):
+        # Overlay delle fughe in anteprima (solo visivo)
+        self._switch = self._coords = self._lines = None
+        try:
+            from pivy import coin
+        except ImportError:
+            return
+        self._switch = coin.SoSwitch()
+        sep = coin.SoSeparator()
+        color = coin.SoBaseColor()
+        color.rgb = (0.2, 0.2, 0.2)
+        style = coin.SoDrawStyle()
+        style.lineWidth = 1.5
+        self._coords = coin.SoCoordinate3()
+        self._lines = coin.SoLineSet()
+        for node in (color, style, self._coords, self._lines):
+            sep.addChild(node)
+        self._switch.addChild(sep)
+        self._switch.whichChild = 0
+        vobj.RootNode.addChild(self._switch)
+
+    def updateData(self, fp, prop):
+        if prop == "PreviewLines" and getattr(self, "_coords", None) is not None:
+            pts = [(p.x, p.y, p.z) for p in fp.PreviewLines]
+            self._coords.point.deleteValues(0)
+            self._lines.numVertices.deleteValues(0)
+            if pts:
+                self._coords.point.setValues(0, len(pts), pts)
+                self._lines.numVertices.setValues(0, len(pts) // 2, [2] * (len(pts) // 2))
+
+    def onChanged(self, vobj, prop):
+        if prop == "Visibility" and getattr(self, "_switch", None) is not None:
+            self._switch.whichChild = 0 if vobj.Visibility else -1
+
+    def dumps(self): return None
+    def loads(self, state): return None
+    __getstate__ = dumps
+    __setstate__ = loads
+
+class FB_Feature:
+    """Base degli ostacoli: build(fp) crea la forma, execute la recupera dalla cache se possibile."""
+    def ensure_properties(self, obj):
+        if not hasattr(obj, "LOD"):
+            obj.addProperty("App::PropertyEnumeration","LOD","Texture","Livello di dettaglio (Auto = livello del documento)")
+            obj.LOD = ["Auto"] + LOD_LEVELS
+            obj.LOD = "Auto"
+        if not hasattr(obj, "PreviewLines"):
+            obj.addProperty("App::PropertyVectorList","PreviewLines","Texture","Fughe in anteprima", 8, False, True)
+        if hasattr(obj, "BrickL") and not hasattr(obj, "Pattern"):
+            obj.addProperty("App::PropertyEnumeration","Pattern","Texture","Disposizione dei mattoni")
+            obj.Pattern = layout.PATTERNS
+            obj.Pattern = "Running"
+        if not hasattr(obj, "TextureStatus"):
+            obj.addProperty("App::PropertyString","TextureStatus","Texture","Zone in cui il taglio delle fughe è fallito", 8, True)
+        if not hasattr(obj, "StoreShape"):
+            obj.addProperty("App::PropertyBool","StoreShape","File","Salva la forma nel file (False: solo parametri, forma rigenerata all'apertura)")
+            obj.StoreShape = store_shapes_pref()
+        if not hasattr(obj, "ShapeFingerprint"):
+            obj.addProperty("App::PropertyString","ShapeFingerprint","File","Chiave della forma calcolata", 8, False, True)
+        apply_storage(obj)
+
+    def onChanged(self, fp, prop):
+        if prop == "StoreShape":
+            apply_storage(fp)
+
+    def onDocumentRestored(self, fp):
+        self.ensure_properties(fp)
+        if fp.Shape.isNull():
+            _queue(fp)
+
+    def execute(self, fp):
+        if not profiling.enabled():
+            return self._execute(fp)
+        with profiling.session() as timings:
+            self._execute(fp)
+        profiling.store(fp, timings)
+
+    def _execute(self, fp):
+        self._lines, self._grooves, self._failed = [], [], []
+        key = None if shape_cache.bypass else instance_key(fp)
+        hit = _shared(key)
+        if hit is not None:
+            shape, lines = hit
+        else:
+            if texture_level(fp) == "Export":
+                shape = shape_cache.fetch(fp, self.build)
+            else:
+                shape = self.build(fp)
+            lines = [p for line in self._lines for p in line]
+            # Texture incompleta: non va riusata (fetch non la mette in cache)
+            if not self._failed and key is not None and shape is not None and not shape.isNull():
+                _share(key, shape, lines)
+        fp.TextureStatus = failure_report(self._failed)
+        if self._failed:
+            fc.Console.PrintWarning(f"{fp.Label}: texture incompleta, {fp.TextureStatus}\n")
+        fp.PreviewLines = lines
+        fp.ShapeFingerprint = fingerprint(key or instance_key(fp))
+        if shape is not None:
+            fp.Shape = shape
+
+    def build(self, fp):
+        raise NotImplementedError
+
+    def texture(self, fp, shape, groups, gd):
+        """Fughe dei mattoni secondo il LOD: taglio reale, linee o niente."""
+        level = texture_level(fp)
+        if level == "Export":
+            with profiling.phase("texture"):
+                return brick_utils.apply_brick_faces(shape, groups, gd, failed=self.__dict__.setdefault("_failed", []))
+        if level == "Preview":
+            self._lines += brick_utils.groove_lines(groups)
+            self._grooves.append(("V", groups, gd, gd / 2.0))
+        return shape
+
+    def brick_groups(self, fp, w, h, l, sides=4, origin=None, profile=None):
+        """profile: bordo superiore delle fiancate [(u, h), ...] per forme non rettangolari."""
+        return brick_utils.texture_groups(w, h, l, fp.BrickL.Value, fp.BrickH.Value, sides, origin, profile, fp.Groove.Value, fp.Pattern)
+
+    def tiles(self, fp, shape, groups, gd, depth):
+        level = texture_level(fp)
+        if level == "Export":
+            with profiling.phase("texture"):
+                return brick_utils.apply_tile_faces(shape, groups, gd, depth, failed=self.__dict__.setdefault("_failed", []))
+        if level == "Preview":
+            self._lines += brick_utils.groove_lines(groups)
+            self._grooves.append(("flat", groups, gd, depth))
+        return shape
+
+    # --- STADI MEMORIZZATI ---
+    # build() è diviso in stadi (corpo, texture, slab, fori...) tenuti sul
+    # proxy con la chiave dei propri ingressi: una modifica ricalcola solo gli
+    # stadi a valle della proprietà cambiata. La chiave di ogni stadio include
+    # quella dello stadio a monte.
+
+    def stage(self, name, key, build):
+        """Ritorna (key, forma) rieseguendo build() solo se key è cambiata.
+        La forma è condivisa con la memoria del proxy: non modificarla sul posto."""
+        stages = self.__dict__.setdefault("_stages", {})
+        lines = self.__dict__.setdefault("_lines", [])
+        grooves = self.__dict__.setdefault("_grooves", [])
+        failed = self.__dict__.setdefault("_failed", [])
+        hit = stages.get(name)
+        if hit is not None and hit[0] == key:
+            lines += hit[2]
+            grooves += hit[3]
+            return key, hit[1]
+        n, m, f = len(lines), len(grooves), len(failed)
+        shape = build()
+        if len(failed) > f:
+            # Fasce fallite: lo stadio non viene memorizzato, così il prossimo
+            # ricalcolo ritenta; la chiave nuova fa ricalcolare anche gli stadi a valle
+            stages.pop(name, None)
+            return (key, object()), shape
+        stages[name] = (key, shape, lines[n:], grooves[m:])
+        return key, shape
+
+    def groove_lines(self, fp):
+        """Mezzerie delle fughe in coordinate oggetto, ricavate con una build a
+        livello Preview (nessun boolean di texture) senza toccare l'oggetto."""
+        return self.groove_layout(fp)[1]
+
+    def groove_layout(self, fp):
+        """(forma senza fughe, linee delle fughe, fughe) in coordinate oggetto,
+        da una build Preview. Le fughe sono (profilo, gruppi, larghezza,
+        profondità) con profilo "V" (mattoni) o "flat" (piastrelle)."""
+        # Stadi propri: la build Preview non deve sostituire quelli della
+        # build normale (altrimenti il prossimo Export rifà tutta la texture)
+        stages = self.__dict__.pop("_stages", None)
+        self._stages = self.__dict__.pop("_preview_stages", {})
+        self._forced_level, self._lines, self._grooves, self._failed = "Preview", [], [], []
+        try:
+            shape = self.build(fp)
+            return shape, list(self._lines), list(self._grooves)
+        finally:
+            self._forced_level = None
+            self._preview_stages = self._stages
+            self._stages = stages if stages is not None else {}
+
+    def clear_stages(self):
+        self.__dict__.pop("_stages", None)
+        self.__dict__.pop("_preview_stages", None)
+
+    def textured(self, fp, key, shape, groups, gd, depth=None):
+        """Stadio texture sul corpo identificato da key: mattoni, o piastrelle se depth."""
+        drawing = layout.layout_key(groups)
+        if depth is None:
+            return self.stage("texture", (key, texture_level(fp), gd, drawing), lambda: self.texture(fp, shape, groups, gd))
+        return self.stage("texture", (key, texture_level(fp), gd, depth, drawing), lambda: self.tiles(fp, shape, groups, gd, depth))
+
+    def dumps(self): return None
+    def loads(self, state): return None
+    __getstate__ = dumps
+    __setstate__ = loads
+
+@registry.obstacle("Ledge", "Ledge", "FB_Ledge.svg", order=3)
+class FB_Ledge(FB_Feature):
     def __init__(self, obj):
         obj.addProperty("App::PropertyLength","Length","Dim").Length = 120.0
         obj.addProperty("App::PropertyLength","Height","Dim").Height = 35.0
@@ -59,30 +411,38 @@ class FB_Ledge:
         obj.addProperty("App::PropertyLength","BrickH","Texture").BrickH = 10.0
         obj.addProperty("App::PropertyLength","Groove","Texture").Groove = 1.2
         obj.addProperty("App::PropertyBool","LockTexture","Texture").LockTexture = False 
+        self.ensure_properties(obj)
         obj.Proxy = self
 
-    def execute(self, fp):
+    def build(self, fp):
         L, H, W = fp.Length.Value, fp.Height.Value, fp.Width.Value
+        gd = fp.Groove.Value
         
         if fp.UseSlab:
             SH, OH = fp.SlabH.Value, fp.Overhang.Value
             base_L, base_W, base_H = L - (2*OH), W - (2*OH), H - SH
+            origin = fc.Vector(OH, OH, 0)
             
-            base_wall = Part.makeBox(base_L, base_W, base_H)
+            # Il corpo arriva fino in cima e la parte sopra base_H resta dentro la
+            # slab: cambiare SlabH non tocca corpo e texture (basta togliere i
+            # corsi di fughe che finirebbero sotto la slab)
+            key, base_wall = self.stage("body", (L, W, H, OH), lambda: Part.makeBox(base_L, base_W, H, origin))
             if fp.Texture:
-                base_wall = brick_utils.apply_texture(base_wall, base_L, base_H, base_W, fp.BrickL.Value, fp.BrickH.Value, fp.Groove.Value, sides=4)
-            base_wall.translate(fc.Vector(OH, OH, 0))
+                groups = layout.drop_rows(self.brick_groups(fp, base_L, H, base_W, 4, origin), base_H - gd / 2.0)
+                key, base_wall = self.textured(fp, key, base_wall, groups, gd)
             
             slab = Part.makeBox(L, W, SH).translate(fc.Vector(0, 0, base_H))
-            fp.Shape = base_wall.fuse(slab)
+            with profiling.phase("slab"):
+                return self.stage("slab", (key, SH), lambda: base_wall.fuse(slab))[1]
         else:
             # Senza Slab: la base occupa tutta l'altezza e tutta la pianta
-            base_wall = Part.makeBox(L, W, H)
+            key, base_wall = self.stage("body", (L, W, H), lambda: Part.makeBox(L, W, H))
             if fp.Texture:
-                base_wall = brick_utils.apply_texture(base_wall, L, H, W, fp.BrickL.Value, fp.BrickH.Value, fp.Groove.Value, sides=4)
-            fp.Shape = base_wall
+                key, base_wall = self.textured(fp, key, base_wall, self.brick_groups(fp, L, H, W, 4), gd)
+            return base_wall
 
-class FB_Hubba:
+@registry.obstacle("Hubba", "Hubba", "FB_Hubba.svg", order=5)
+class FB_Hubba(FB_Feature):
     def __init__(self, obj):
         # Parametri Dimensionali
         obj.addProperty("App::PropertyLength","Length","Dim").Length = 150.0
@@ -99,9 +459,10 @@ class FB_Hubba:
         obj.addProperty("App::PropertyLength","BrickH","Texture").BrickH = 10.0
         obj.addProperty("App::PropertyLength","Groove","Texture").Groove = 1.2
         obj.addProperty("App::PropertyBool","LockTexture","Texture").LockTexture = False 
+        self.ensure_properties(obj)
         obj.Proxy = self
 
-    def execute(self, fp):
+    def build(self, fp):
         L, W = fp.Length.Value, fp.Width.Value
         HS, HE = fp.HeightStart.Value, fp.HeightEnd.Value
         
@@ -112,25 +473,26 @@ class FB_Hubba:
             bW = W - (2 * OH)
             
             # Profilo Base
-            pts = [fc.Vector(0,0,0), fc.Vector(L,0,0), fc.Vector(L,0,bHE), fc.Vector(0,0,bHS), fc.Vector(0,0,0)]
-            base = Part.Face(Part.makePolygon(pts)).extrude(fc.Vector(0, bW, 0))
+            pts = [fc.Vector(0,OH,0), fc.Vector(L,OH,0), fc.Vector(L,OH,bHE), fc.Vector(0,OH,bHS), fc.Vector(0,OH,0)]
+            key, base = self.stage("body", (L, OH, bW, bHS, bHE), lambda: Part.Face(Part.makePolygon(pts)).extrude(fc.Vector(0, bW, 0)))
             if fp.Texture:
-                # Approssimiamo l'altezza media per la texture
-                base = brick_utils.apply_texture(base, L, max(bHS, bHE), bW, fp.BrickL.Value, fp.BrickH.Value, fp.Groove.Value, sides=4)
-            base.translate(fc.Vector(0, OH, 0))
+                profile = [(0, bHS), (L, bHE)]
+                key, base = self.textured(fp, key, base, self.brick_groups(fp, L, max(bHS, bHE), bW, 4, fc.Vector(0, OH, 0), profile), fp.Groove.Value)
             
             # Profilo Slab
             pts_s = [fc.Vector(0,0,bHS), fc.Vector(L,0,bHE), fc.Vector(L,0,HE), fc.Vector(0,0,HS), fc.Vector(0,0,bHS)]
             slab = Part.Face(Part.makePolygon(pts_s)).extrude(fc.Vector(0, W, 0))
-            fp.Shape = base.fuse(slab)
+            with profiling.phase("slab"):
+                return self.stage("slab", (key, W, HS, HE), lambda: base.fuse(slab))[1]
         else:
             pts = [fc.Vector(0,0,0), fc.Vector(L,0,0), fc.Vector(L,0,HE), fc.Vector(0,0,HS), fc.Vector(0,0,0)]
-            shape = Part.Face(Part.makePolygon(pts)).extrude(fc.Vector(0, W, 0))
+            key, shape = self.stage("body", (L, W, HS, HE), lambda: Part.Face(Part.makePolygon(pts)).extrude(fc.Vector(0, W, 0)))
             if fp.Texture:
-                shape = brick_utils.apply_texture(shape, L, max(HS, HE), W, fp.BrickL.Value, fp.BrickH.Value, fp.Groove.Value, sides=4)
-            fp.Shape = shape
+                key, shape = self.textured(fp, key, shape, self.brick_groups(fp, L, max(HS, HE), W, 4, profile=[(0, HS), (L, HE)]), fp.Groove.Value)
+            return shape
 
-class FB_Steps:
+@registry.obstacle("Steps", "Gradini", "FB_Steps.svg", order=4)
+class FB_Steps(FB_Feature):
     def __init__(self, obj):
         obj.addProperty("App::PropertyInteger","Steps","Base").Steps = 3
         obj.addProperty("App::PropertyLength","TotalHeight","Base").TotalHeight = 45.0
@@ -149,12 +511,12 @@ class FB_Steps:
         obj.addProperty("App::PropertyLength","BrickH","Texture").BrickH = 10.0
         obj.addProperty("App::PropertyLength","Groove","Texture").Groove = 1.2
         obj.addProperty("App::PropertyBool","LockTexture","Texture").LockTexture = False 
+        self.ensure_properties(obj)
         obj.Proxy = self
 
-    def execute(self, fp):
-        res = None
+    def build(self, fp):
         S = fp.Steps
-        if S < 1: return
+        if S < 1: return None
         
         # CALCOLO AUTOMATICO: Altezza totale diviso numero gradini
         total_H = fp.TotalHeight.Value
@@ -163,45 +525,67 @@ class FB_Steps:
         W = fp.StepW.Value
         TW = fp.Width.Value
         
-        for i in range(S):
-            curr_total_h = step_h_calc * (i + 1)
-            
-            if fp.UseSlab:
-                SH, OH = fp.SlabH.Value, fp.Overhang.Value
-                base_h = curr_total_h - SH
-                base_width = TW - (2 * OH)
-                
-                # Creazione Base (Alzata) all'origine per la texture
-                step_base = Part.makeBox(base_width, W, base_h)
-                if fp.Texture and base_h > 0:
-                    step_base = brick_utils.apply_texture(step_base, base_width, base_h, W, fp.BrickL.Value, fp.BrickH.Value, fp.Groove.Value, sides=4)
-                
-                # Traslazione dopo la texture
-                step_base.translate(fc.Vector(OH, i * W, 0))
-                
-                # Creazione Slab (Pedata)
-                slab = Part.makeBox(TW, W + OH, SH).translate(fc.Vector(0, i * W, base_h))
-                current_step = step_base.fuse(slab)
-            else:
-                # Senza Slab: Blocco unico di mattoni
-                step_base = Part.makeBox(TW, W, curr_total_h)
-                if fp.Texture:
-                    step_base = brick_utils.apply_texture(step_base, TW, curr_total_h, W, fp.BrickL.Value, fp.BrickH.Value, fp.Groove.Value, sides=4)
-                step_base.translate(fc.Vector(0, i * W, 0))
-                current_step = step_base                
-            res = current_step if res is None else res.fuse(current_step)
+        if fp.UseSlab:
+            SH, OH = fp.SlabH.Value, fp.Overhang.Value
+            x0, body_w = OH, TW - (2 * OH)
+            tops = [step_h_calc * (i + 1) - SH for i in range(S)]
+        else:
+            # Senza Slab: le alzate occupano tutta la larghezza e tutta l'altezza
+            x0, body_w = 0, TW
+            tops = [step_h_calc * (i + 1) for i in range(S)]
+
+        # Corpo unico a gradoni: profilo YZ estruso lungo X (niente fuse in serie)
+        pts = [fc.Vector(x0, 0, 0)]
+        for i, top in enumerate(tops):
+            pts += [fc.Vector(x0, i * W, top), fc.Vector(x0, (i + 1) * W, top)]
+        pts += [fc.Vector(x0, S * W, 0), fc.Vector(x0, 0, 0)]
+        key, res = self.stage("body", (x0, body_w, W, tuple(tops)), lambda: Part.Face(Part.makePolygon(pts)).extrude(fc.Vector(body_w, 0, 0)))
+
+        if fp.Texture and tops[0] > 0:
+            key, res = self.textured(fp, key, res, self.texture_faces(fp, x0, body_w, W, tops), fp.Groove.Value)
+
+        if fp.UseSlab:
+            # Pedate, unite al corpo con un solo boolean
+            slabs = [Part.makeBox(TW, W + OH, SH).translate(fc.Vector(0, i * W, top)) for i, top in enumerate(tops)]
+            with profiling.phase("slab"):
+                key, res = self.stage("slab", (key, TW, OH, SH), lambda: res.multiFuse(slabs))
 
         # Aggiunta fori per Rail
-        if fp.RailHoles and res:
+        if fp.RailHoles:
             r_rad = fp.RailDiam.Value / 2
             # Foro in cima (sull'ultimo gradino) e in fondo (sul primo)
             hole_top = Part.makeCylinder(r_rad, 20, fc.Vector(fp.RailDist.Value, (S-1)*W + W/2, total_H-15), fc.Vector(0,0,1))
             hole_bot = Part.makeCylinder(r_rad, 20, fc.Vector(fp.RailDist.Value, W/2, step_h_calc-15), fc.Vector(0,0,1))
-            res = res.cut(hole_top.fuse(hole_bot))
+            with profiling.phase("holes"):
+                key, res = self.stage("holes", (key, r_rad, fp.RailDist.Value, total_H), lambda: res.cut(hole_top.fuse(hole_bot)))
         
-        fp.Shape = res
+        return res
 
-class FB_Jersey:
+    def texture_faces(self, fp, x0, body_w, W, tops):
+        """Gruppi di facce da texturizzare sul corpo a gradoni. Le fughe vengono
+        calcolate una volta per l'alzata più alta e riusate per tutte le altre."""
+        BL, BH = fp.BrickL.Value, fp.BrickH.Value
+        X, Y, Z = fc.Vector(1,0,0), fc.Vector(0,1,0), fc.Vector(0,0,1)
+        S, top = len(tops), tops[-1]
+        # Fiancate: fughe ritagliate sul profilo a gradoni (metà del rettangolo è vuota)
+        profile = [(u, t) for i, t in enumerate(tops) for u in (i * W, (i + 1) * W)]
+        side = layout.clip_to_profile(layout.brick(fp.Pattern, S * W, top, BL, BH), profile, fp.Groove.Value)
+        front = layout.brick(fp.Pattern, body_w, top, BL, BH)
+        sides = [(brick_utils.frame_placement(fc.Vector(x, 0, 0), Y, Z), side) for x in (x0, x0 + body_w)]
+        # Retro e parti scoperte delle alzate: ogni alzata mostra solo la fascia
+        # sopra il gradino precedente. Le fasce che iniziano alla stessa fase del
+        # paramento (layout.period) hanno lo stesso disegno e riusano l'utensile.
+        fronts = [(brick_utils.frame_placement(fc.Vector(x0, S * W, 0), X, Z), front)]
+        period = layout.period(fp.Pattern, BL, BH)
+        for i, t in enumerate(tops):
+            lo = tops[i - 1] if i > 0 else 0.0
+            shift = (lo // period) * period if period else 0.0
+            band = layout.clip_rows(front, lo, t) - (0, shift, 0, shift)
+            fronts.append((brick_utils.frame_placement(fc.Vector(x0, i * W, shift), X, Z), band))
+        return [sides, fronts]
+
+@registry.obstacle("Jersey", "Jersey", "FB_Jersey.svg", order=6)
+class FB_Jersey(FB_Feature):
     def __init__(self, obj):
         obj.addProperty("App::PropertyLength","Length","Base").Length = 120.0
         obj.addProperty("App::PropertyLength","Height","Base").Height = 60.0
@@ -219,20 +603,25 @@ class FB_Jersey:
         obj.addProperty("App::PropertyLength","BrickH","Texture").BrickH = 10.0
         obj.addProperty("App::PropertyLength","Groove","Texture").Groove = 1.2
         obj.addProperty("App::PropertyBool","LockTexture","Texture").LockTexture = True
+        self.ensure_properties(obj)
         obj.Proxy = self
-    def execute(self, fp):
+    def build(self, fp):
         L, H, BW, TW, BH, SH = fp.Length.Value, fp.Height.Value, fp.BaseWidth.Value, fp.TopWidth.Value, fp.BaseHeight.Value, fp.SlopeHeight.Value
         pts = [fc.Vector(0,0,0), fc.Vector(BW,0,0), fc.Vector(BW,0,BH), fc.Vector(TW+(BW-TW)*0.75, 0, BH+SH), fc.Vector(BW/2+TW/2, 0, H), fc.Vector(BW/2-TW/2, 0, H), fc.Vector(BW-(TW+(BW-TW)*0.75), 0, BH+SH), fc.Vector(0,0,BH), fc.Vector(0,0,0)]
-        shape = Part.Face(Part.makePolygon(pts)).extrude(fc.Vector(0, L, 0))
+        key, shape = self.stage("body", (L, H, BW, TW, BH, SH), lambda: Part.Face(Part.makePolygon(pts)).extrude(fc.Vector(0, L, 0)))
         if fp.EnableJoint:
             jl, jw, jh, tol = fp.JointLen.Value, fp.JointWidth.Value, fp.JointHeight.Value, fp.Tolerance.Value
             male = Part.makeBox(jw, jl, jh).translate(fc.Vector(BW/2 - jw/2, L, (H-jh)/2))
             female = Part.makeBox(jw+tol, jl+1.0, jh+tol).translate(fc.Vector(BW/2 - (jw+tol)/2, -1.0, (H-(jh+tol))/2))
-            shape = shape.fuse(male).cut(female)
-        if fp.Texture: shape = brick_utils.apply_texture(shape, BW, H, L, fp.BrickL.Value, fp.BrickH.Value, fp.Groove.Value, sides=3)
-        fp.Shape = shape
+            with profiling.phase("joint"):
+                key, shape = self.stage("joint", (key, jl, jw, jh, tol), lambda: shape.fuse(male).cut(female))
+        if fp.Texture:
+            profile = [(p.x, p.z) for p in pts[7:1:-1]] # Bordo superiore, da sinistra a destra
+            key, shape = self.textured(fp, key, shape, self.brick_groups(fp, BW, H, L, 3, profile=profile), fp.Groove.Value)
+        return shape
 
-class FB_QuarterPipe:
+@registry.obstacle("QuarterPipe", "QuarterPipe", "FB_QP.svg", command="FB_QP", order=2)
+class FB_QuarterPipe(FB_Feature):
     def __init__(self, obj):
         obj.addProperty("App::PropertyLength","Radius","Base").Radius = 120.0
         obj.addProperty("App::PropertyLength","Platform","Base").Platform = 30.0
@@ -246,11 +635,23 @@ class FB_QuarterPipe:
         obj.addProperty("App::PropertyLength","BrickH","Texture").BrickH = 10.0
         obj.addProperty("App::PropertyLength","Groove","Texture").Groove = 1.2
         obj.addProperty("App::PropertyBool","LockTexture","Texture").LockTexture = False
+        self.ensure_properties(obj)
         obj.Proxy = self
-    def execute(self, fp):
+    def build(self, fp):
         R, W, P = fp.Radius.Value, fp.Width.Value, fp.Platform.Value
         total_L = R + P
-        shape = Part.makeBox(total_L, W, R).cut(Part.makeCylinder(R, W, fc.Vector(0,0,R), fc.Vector(0,1,0)))
+        key, shape = self.stage("body", (R, W, P), lambda: Part.makeBox(total_L, W, R).cut(Part.makeCylinder(R, W, fc.Vector(0,0,R), fc.Vector(0,1,0))))
+        if fp.Texture:
+            # Corde dell'arco: stanno sopra la curva (convessa), quindi non accorciano fughe utili
+            n = ARC_SEGMENTS
+            profile = [(R * i / n, R - math.sqrt(R**2 - (R * i / n)**2)) for i in range(n + 1)] + [(total_L, R)]
+            key, shape = self.textured(fp, key, shape, self.brick_groups(fp, total_L, R, W, 3, profile=profile), fp.Groove.Value)
+        # Coping e legno dopo la texture: si ritoccano senza rifare le fughe
+        slots = (fp.CopingDiam.Value, fp.CopingScasso, fp.WoodSlot, fp.WoodThick.Value)
+        with profiling.phase("slots"):
+            return self.stage("slots", (key, slots), lambda: self.slots(fp, shape, R, W, total_L))[1]
+
+    def slots(self, fp, shape, R, W, total_L):
         if fp.CopingDiam.Value > 0:
             c_pos = fc.Vector(R+1.0, 0, R-1.0)
             c_obj = Part.makeCylinder(fp.CopingDiam.Value/2, W, c_pos, fc.Vector(0,1,0))
@@ -260,10 +661,10 @@ class FB_QuarterPipe:
             x_s = math.sqrt(2*wt*R - wt**2)
             trim = Part.makeBox(total_L-x_s, W-4, R+10).translate(fc.Vector(x_s, 2, -5))
             shape = shape.cut(Part.makeCylinder(R+wt, W, fc.Vector(0,0,R), fc.Vector(0,1,0)).common(trim))
-        if fp.Texture: shape = brick_utils.apply_texture(shape, total_L, R, W, fp.BrickL.Value, fp.BrickH.Value, fp.Groove.Value, sides=3)
-        fp.Shape = shape
+        return shape
 
-class FB_Kicker:
+@registry.obstacle("Kicker", "Kicker", "FB_Kicker.svg", order=1)
+class FB_Kicker(FB_Feature):
     def __init__(self, obj):
         obj.addProperty("App::PropertyLength","Length","Base").Length = 150.0
         obj.addProperty("App::PropertyLength","Height","Base").Height = 40.0
@@ -273,15 +674,17 @@ class FB_Kicker:
         obj.addProperty("App::PropertyLength","BrickH","Texture").BrickH = 10.0
         obj.addProperty("App::PropertyLength","Groove","Texture").Groove = 1.2
         obj.addProperty("App::PropertyBool","LockTexture","Texture").LockTexture = False
+        self.ensure_properties(obj)
         obj.Proxy = self
-    def execute(self, fp):
+    def build(self, fp):
         L, H, W = fp.Length.Value, fp.Height.Value, fp.Width.Value
         wire = Part.makePolygon([fc.Vector(0,0,0), fc.Vector(L,0,0), fc.Vector(L,0,H), fc.Vector(0,0,0)])
-        shape = Part.Face(wire).extrude(fc.Vector(0, W, 0))
-        if fp.Texture: shape = brick_utils.apply_texture(shape, L, H, W, fp.BrickL.Value, fp.BrickH.Value, fp.Groove.Value, sides=3)
-        fp.Shape = shape
+        key, shape = self.stage("body", (L, H, W), lambda: Part.Face(wire).extrude(fc.Vector(0, W, 0)))
+        if fp.Texture: key, shape = self.textured(fp, key, shape, self.brick_groups(fp, L, H, W, 3, profile=[(0, 0), (L, H)]), fp.Groove.Value)
+        return shape
 
-class FB_Base:
+@registry.obstacle("BasePark", "Pavimento", "FB_Base.svg", command="FB_Base", order=7)
+class FB_Base(FB_Feature):
     def __init__(self, obj):
         # Dimensioni
         obj.addProperty("App::PropertyLength","Length","Dim").Length = 200.0
@@ -303,10 +706,36 @@ class FB_Base:
         obj.addProperty("App::PropertyLength","TileSize","Texture").TileSize = 50.0
         obj.addProperty("App::PropertyLength","Groove","Texture").Groove = 1.0
         obj.addProperty("App::PropertyLength","GrooveDepth","Texture").GrooveDepth = 0.5
+        self.ensure_properties(obj)
         obj.Proxy = self
 
-    def execute(self, fp):
+    def ensure_properties(self, obj):
+        super().ensure_properties(obj)
+        # Piazze grandi: contorno estruso e piastrelle a riquadri
+        if not hasattr(obj, "LargePlaza"):
+            obj.addProperty("App::PropertyBool","LargePlaza","Piazza","Contorno estruso e fughe tagliate a riquadri (consigliato oltre 500 mm)").LargePlaza = False
+            obj.addProperty("App::PropertyLength","ChunkSize","Piazza","Lato dei riquadri (arrotondato a un multiplo di TileSize)").ChunkSize = 200.0
+            obj.addProperty("App::PropertyBool","PrintTiles","Piazza","Forma finale come pezzi separati, uno per riquadro, da stampare").PrintTiles = False
+
+    def build(self, fp):
         L, W, T = fp.Length.Value, fp.Width.Value, fp.Thickness.Value
+        fillets = (fp.FilletFL.Value, fp.FilletFR.Value, fp.FilletBL.Value, fp.FilletBR.Value,
+                   fp.FilletTopFront.Value, fp.FilletTopBack.Value, fp.FilletTopLeft.Value, fp.FilletTopRight.Value)
+        if fp.LargePlaza:
+            return self.build_large(fp, L, W, T, fillets)
+        key, shape = self.stage("body", (L, W, T, fillets), lambda: self.plate(fp, L, W, T))
+
+        # 3. TEXTURE (Ultima operazione)
+        if fp.Tiles:
+            # Le fughe servono solo dove c'è materiale alla quota del loro fondo
+            z_top, gd = shape.BoundBox.ZMax, fp.Groove.Value
+            outline = brick_utils.section_outline(shape, z_top - fp.GrooveDepth.Value, gd)
+            groups = brick_utils.tile_groups(L, W, fp.TileSize.Value, fp.Rotate45, z_top, outline)
+            key, shape = self.textured(fp, key, shape, groups, gd, fp.GrooveDepth.Value)
+            
+        return self.stage("clean", key, lambda: shape.removeSplitter())[1]
+
+    def plate(self, fp, L, W, T):
         shape = Part.makeBox(L, W, T)
         # 1. FILLET VERTICALI (Raggruppati per raggio per stabilità)
         fillets_v = {}
@@ -322,10 +751,11 @@ class FB_Base:
                     if r not in fillets_v: fillets_v[r] = []
                     fillets_v[r].append(e)
         
-        for r, edges in fillets_v.items():
-            shape = shape.makeFillet(r, edges)
+        with profiling.phase("fillet"):
+            for r, edges in fillets_v.items():
+                shape = shape.makeFillet(r, edges)
 
-        shape = shape.removeSplitter() # Pulisce le facce dopo i fillet verticali
+            shape = shape.removeSplitter() # Pulisce le facce dopo i fillet verticali
 
         # 2. FILLET SUPERIORI
         fillets_t = {}
@@ -341,19 +771,130 @@ class FB_Base:
                     if r not in fillets_t: fillets_t[r] = []
                     fillets_t[r].append(e)
 
-        for r, edges in fillets_t.items():
-            try: shape = shape.makeFillet(r, edges)
-            except: pass
+        with profiling.phase("fillet"):
+            for r, edges in fillets_t.items():
+                try: shape = shape.makeFillet(r, edges)
+                except: pass
 
-        shape = shape.removeSplitter() # Pulisce prima di tagliare le piastrelle
+            shape = shape.removeSplitter() # Pulisce prima di tagliare le piastrelle
+        return shape
 
-        # 3. TEXTURE (Ultima operazione)
+    # --- PIAZZA GRANDE ---
+    # Il contorno con gli angoli arrotondati è disegnato in 2D ed estruso, la
+    # piastra viene poi divisa in riquadri allineati alle fughe: ogni riquadro
+    # ha i suoi boolean, di costo limitato qualunque sia la misura della piazza.
+
+    def build_large(self, fp, L, W, T, fillets):
+        key, shape = self.stage("body", ("large", L, W, T, fillets), lambda: self.outline_plate(fp, L, W, T))
+        level = texture_level(fp)
+        chunked = fp.PrintTiles or (fp.Tiles and level == "Export")
+        if not chunked:
+            if fp.Tiles:
+                groups = brick_utils.tile_groups(L, W, fp.TileSize.Value, fp.Rotate45, T, [self.corner_points(fp, L, W)])
+                key, shape = self.textured(fp, key, shape, groups, fp.Groove.Value, fp.GrooveDepth.Value)
+            return shape
+
+        step = fp.ChunkSize.Value
+        if not fp.Rotate45:
+            # Bordi dei riquadri sulle fughe: i pezzi stampati si affiancano come piastrelle
+            tile = fp.TileSize.Value
+            step = max(1, round(step / tile)) * tile
+        key, pieces = self.stage("chunks", (key, step), lambda: self.chunks(shape, L, W, step))
         if fp.Tiles:
-            # Passiamo correttamente i parametri: shape, L, W, dimensione, larghezza fuga, rotazione, profondità
-            shape = brick_utils.apply_horizontal_tiles(
-                shape, L, W, fp.TileSize.Value, fp.Groove.Value, 
-                fp.Rotate45, fp.GrooveDepth.Value
-            )
-            
-        fp.Shape = shape.removeSplitter()
-        
+            gd, depth = fp.Groove.Value, fp.GrooveDepth.Value
+            tiles_key = (key, level, fp.TileSize.Value, fp.Rotate45, gd, depth)
+            key, pieces = self.stage("tiles", tiles_key, lambda: self.tile_chunks(fp, pieces, L, W, T))
+        if fp.PrintTiles:
+            return Part.makeCompound(pieces)
+        return self.stage("fuse", key, lambda: self.fuse_chunks(pieces))[1]
+
+    def corner_points(self, fp, L, W):
+        """Contorno in pianta come poligono (per ritagliare le fughe in anteprima)."""
+        return [(p.x, p.y) for p in self.outline_wire(fp, L, W).discretize(Deflection=0.05)]
+
+    def outline_wire(self, fp, L, W):
+        """Rettangolo L x W con i quattro angoli verticali raccordati."""
+        limit = min(L, W) / 2.0
+        r_fl, r_fr, r_br, r_bl = (min(r, limit) for r in (fp.FilletFL.Value, fp.FilletFR.Value, fp.FilletBR.Value, fp.FilletBL.Value))
+        V = lambda x, y: fc.Vector(x, y, 0)
+        # Angoli in senso antiorario: (tangenza in arrivo, tangenza in uscita, centro, raggio)
+        corners = [(V(L - r_fr, 0), V(L, r_fr), V(L - r_fr, r_fr), r_fr),
+                   (V(L, W - r_br), V(L - r_br, W), V(L - r_br, W - r_br), r_br),
+                   (V(r_bl, W), V(0, W - r_bl), V(r_bl, W - r_bl), r_bl),
+                   (V(0, r_fl), V(r_fl, 0), V(r_fl, r_fl), r_fl)]
+        edges = []
+        start = V(r_fl, 0)
+        for a, b, c, r in corners:
+            if (a - start).Length > 1e-6:
+                edges.append(Part.LineSegment(start, a).toShape())
+            if r > 0:
+                mid = c + ((a + b) * 0.5 - c).normalize() * r
+                edges.append(Part.Arc(a, mid, b).toShape())
+            start = b
+        return Part.Wire(edges)
+
+    def outline_plate(self, fp, L, W, T):
+        shape = Part.Face(self.outline_wire(fp, L, W)).extrude(fc.Vector(0, 0, T))
+        # Raccordi superiori: un solo passaggio sugli spigoli, raggruppati per raggio;
+        # gli archi d'angolo prendono il raggio minore dei due lati
+        sides = {"front": fp.FilletTopFront.Value, "back": fp.FilletTopBack.Value,
+                 "left": fp.FilletTopLeft.Value, "right": fp.FilletTopRight.Value}
+        by_radius = {}
+        for e in shape.Edges:
+            mid = e.valueAt((e.FirstParameter + e.LastParameter) / 2)
+            if abs(mid.z - T) > 0.001:
+                continue
+            near = sorted(sides, key=lambda k: {"front": mid.y, "back": W - mid.y, "left": mid.x, "right": L - mid.x}[k])
+            r = sides[near[0]] if isinstance(e.Curve, Part.Line) else min(sides[near[0]], sides[near[1]])
+            if r > 0:
+                by_radius.setdefault(r, []).append(e)
+        with profiling.phase("fillet"):
+            for r, edges in by_radius.items():
+                try: shape = shape.makeFillet(r, edges)
+                except Exception: pass
+        return shape
+
+    def chunks(self, shape, L, W, step):
+        """La piastra divisa in riquadri step x step (solidi separati)."""
+        pieces = []
+        xs, ys = layout.chunk_edges(L, step), layout.chunk_edges(W, step)
+        z0, h = shape.BoundBox.ZMin - 1, shape.BoundBox.ZLength + 2
+        with profiling.phase("chunks"):
+            for x0, x1 in zip(xs, xs[1:]):
+                for y0, y1 in zip(ys, ys[1:]):
+                    box = Part.makeBox(x1 - x0, y1 - y0, h, fc.Vector(x0, y0, z0))
+                    pieces += shape.common(box).Solids
+        return pieces
+
+    def tile_chunks(self, fp, pieces, L, W, T):
+        """Fughe riquadro per riquadro, ritagliate sulla pianta di ciascuno."""
+        gd, depth = fp.Groove.Value, fp.GrooveDepth.Value
+        out = []
+        for k, piece in enumerate(pieces):
+            brick_utils.report(f"riquadro {k + 1}/{len(pieces)}")
+            outline = brick_utils.section_outline(piece, T - depth, gd)
+            if outline is None:
+                out.append(piece)
+                continue
+            groups = brick_utils.tile_groups(L, W, fp.TileSize.Value, fp.Rotate45, T, outline)
+            out.append(self.tiles(fp, piece, groups, gd, depth))
+        return out
+
+    def fuse_chunks(self, pieces):
+        if len(pieces) == 1:
+            return pieces[0]
+        with profiling.phase("fuse"):
+            return pieces[0].multiFuse(pieces[1:]).removeSplitter()
+
+# Tipi di ostacolo per nome (comandi GUI e generatore batch); i pacchetti
+# esterni si aggiungono con @registry.obstacle, vedi registry.py
+OBSTACLE_TYPES = registry.classes()
+
+def make_obstacle(doc, name, cls):
+    """Crea l'oggetto parametrico nel documento (con view provider se c'è la GUI)."""
+    obj = doc.addObject("Part::FeaturePython", name)
+    cls(obj)
+    if fc.GuiUp:
+        ViewProviderFB(obj.ViewObject)
+        obj.ViewObject.Visibility = True
+    return obj
@@ -0,0 +1,312 @@
+import math
+from fractions import Fraction
+from functools import lru_cache
+
+import numpy as np
+
+# Disegno delle fughe, senza FreeCAD: ogni fuga è la mezzeria (u0, v0, u1, v1)
+# di un segmento orizzontale o verticale nel piano di una faccia, e un insieme
+# di fughe è un array numpy (n, 4). Tutti i motori (boolean sul B-rep, linee di
+# anteprima, spostamento della mesh) partono da qui, quindi il disegno può
+# essere calcolato, ritagliato e messo in cache prima di costruire solidi.
+
+PATTERNS = ["Running", "Stack", "Herringbone", "Basket"]
+EMPTY = np.empty((0, 4))
+EMPTY.flags.writeable = False
+
+def as_segments(segments):
+    return np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+
+def _frozen(segs):
+    segs = as_segments(segs)
+    segs.flags.writeable = False
+    return segs
+
+def horizontal(segs):
+    return segs[:, 1] == segs[:, 3]
+
+# --- PARAMENTI ---
+
+def _rows(width, height, bl, bh, margin, shift):
+    """Corsi orizzontali più giunti verticali sfalsati di shift a corsi alterni."""
+    v = np.arange(1, int(height / bh) + 1, dtype=np.float64) * bh
+    v = v[v < height]
+    rows = np.column_stack([np.full_like(v, -margin), v, np.full_like(v, width + margin), v])
+    r = np.arange(int(height / bh) + 1)
+    u = np.arange(int(width / bl) + 2, dtype=np.float64) * bl
+    uu = (u[None, :] + np.where(r % 2, shift, 0.0)[:, None]).ravel()
+    vv = np.repeat(r * bh, len(u))
+    joints = np.column_stack([uu, vv, uu, vv + bh])
+    return np.vstack([rows, joints])
+
+def _rect_edges(x, y, w, h):
+    """I quattro lati di ogni rettangolo (x, y, w, h) come fughe."""
+    return np.vstack([np.column_stack(c) for c in (
+        (x, y, x + w, y), (x, y + h, x + w, y + h), (x, y, x, y + h), (x + w, y, x + w, y + h))])
+
+def _herringbone(width, height, bl, bh, margin):
+    """Spina di pesce a 90°: catene di mattoni orizzontale + verticale lungo
+    la diagonale (passo (bh, bh)), ripetute con passo (bl, -bl)."""
+    L, W = max(bl, bh), min(bl, bh)
+    x0, x1, y0, y1 = -margin - L, width + margin + L, -L, height + L
+    corners = [(x0, y0), (x0, y1), (x1, y0), (x1, y1)]
+    ks = [(x + y) / (2 * W) for x, y in corners]
+    js = [(x - y) / (2 * L) for x, y in corners]
+    k, j = np.meshgrid(np.arange(math.floor(min(ks)) - 1, math.ceil(max(ks)) + 2, dtype=np.float64),
+                       np.arange(math.floor(min(js)) - 1, math.ceil(max(js)) + 2, dtype=np.float64))
+    ox, oy = (k * W + j * L).ravel(), (k * W - j * L).ravel()
+    x = np.concatenate([ox, ox])
+    y = np.concatenate([oy, oy + W])
+    w = np.concatenate([np.full_like(ox, L), np.full_like(ox, W)])
+    h = np.concatenate([np.full_like(ox, W), np.full_like(ox, L)])
+    keep = (x < x1) & (x + w > x0) & (y < y1) & (y + h > y0)
+    return _rect_edges(x[keep], y[keep], w[keep], h[keep])
+
+def _basket(width, height, bl, bh, margin):
+    """Cesto: quadrati di n mattoni affiancati, orientati a scacchiera."""
+    n = max(1, round(bl / bh))
+    cell = n * bh
+    i, j = np.meshgrid(np.arange(math.floor(-margin / cell) - 1, math.ceil((width + margin) / cell) + 1),
+                       np.arange(0, math.ceil(height / cell) + 1))
+    x, y, flip = (i * float(cell)).ravel(), (j * float(cell)).ravel(), ((i + j) % 2).ravel().astype(bool)
+    segs = [_rect_edges(x, y, np.full_like(x, cell), np.full_like(y, cell))]
+    for k in range(1, n):
+        a, b = x[~flip], y[~flip] + k * bh
+        segs.append(np.column_stack([a, b, a + cell, b]))
+        a, b = x[flip] + k * bh, y[flip]
+        segs.append(np.column_stack([a, b, a, b + cell]))
+    return np.vstack(segs)
+
+@lru_cache(maxsize=128)
+def brick(pattern, width, height, bl, bh, margin=10.0):
+    """Fughe di un paramento width x height (array di sola lettura, in cache)."""
+    if pattern == "Running":
+        return _frozen(_rows(width, height, bl, bh, margin, bl / 2.0))
+    if pattern == "Stack":
+        return _frozen(_rows(width, height, bl, bh, margin, 0.0))
+    build = _herringbone if pattern == "Herringbone" else _basket
+    segs = clip_rect(merge_collinear(build(width, height, bl, bh, margin)), -margin, 0.0, width + margin, height)
+    # Come per il paramento a correre: niente fughe orizzontali sul bordo inferiore e superiore
+    segs = segs[~horizontal(segs) | ((segs[:, 1] > 0) & (segs[:, 1] < height))]
+    return _frozen(segs)
+
+def period(pattern, bl, bh):
+    """Passo verticale dopo cui il disegno si ripete (None se non c'è)."""
+    if pattern == "Running":
+        return 2 * bh
+    if pattern == "Stack":
+        return bh
+    if pattern == "Basket":
+        return 2 * max(1, round(bl / bh)) * bh
+    # Spina di pesce: traslazione k*(W, W) + j*(L, -L) con x = 0, cioè k*W = -j*L
+    L, W = max(bl, bh), min(bl, bh)
+    ratio = Fraction(L / W).limit_denominator(16)
+    if abs(float(ratio) - L / W) > 1e-9:
+        return None
+    return ratio.numerator * W + ratio.denominator * L
+
+# --- PIASTRELLE ---
+
+@lru_cache(maxsize=32)
+def grid(length, width, tile_size, margin=5.0):
+    """Fughe di una griglia di piastrelle allineata agli assi."""
+    y = np.arange(int(width / tile_size) + 2, dtype=np.float64) * tile_size
+    x = np.arange(int(length / tile_size) + 2, dtype=np.float64) * tile_size
+    return _frozen(np.vstack([
+        np.column_stack([np.full_like(y, -margin), y, np.full_like(y, length + margin), y]),
+        np.column_stack([x, np.full_like(x, -margin), x, np.full_like(x, width + margin)])]))
+
+@lru_cache(maxsize=32)
+def diagonal_grid(length, width, tile_size):
+    """Griglia quadrata centrata sull'origine, abbastanza grande da coprire
+    la piastra una volta ruotata di 45°."""
+    diag = math.sqrt(length**2 + width**2) + (tile_size * 2)
+    pos = np.arange(int(diag / tile_size) + 2, dtype=np.float64) * tile_size - diag / 2.0
+    lo, hi = np.full_like(pos, -diag / 2.0), np.full_like(pos, diag / 2.0)
+    rows = np.column_stack([lo, pos, hi, pos])
+    cols = np.column_stack([pos, lo, pos, hi])
+    # Alternate come nel disegno originale (l'ordine conta per la chiave degli stadi)
+    return _frozen(np.stack([rows, cols], axis=1).reshape(-1, 4))
+
+# --- OPERAZIONI SUGLI INSIEMI DI FUGHE ---
+
+def merge_collinear(segs, tol=1e-9):
+    """Unisce le fughe sovrapposte o consecutive sulla stessa retta (i lati
+    in comune tra rettangoli vicini diventano una sola fuga)."""
+    segs = as_segments(segs)
+    if not len(segs):
+        return EMPTY
+    horiz = horizontal(segs)
+    line = np.where(horiz, segs[:, 1], segs[:, 0]).round(6)
+    lo = np.where(horiz, np.minimum(segs[:, 0], segs[:, 2]), np.minimum(segs[:, 1], segs[:, 3]))
+    hi = np.where(horiz, np.maximum(segs[:, 0], segs[:, 2]), np.maximum(segs[:, 1], segs[:, 3]))
+    order = np.lexsort((lo, line, horiz))
+    out = []
+    cur = None
+    for i in order:
+        key = (horiz[i], line[i])
+        if cur is not None and cur[0] == key and lo[i] <= cur[2] + tol:
+            cur[2] = max(cur[2], hi[i])
+            continue
+        if cur is not None:
+            out.append(cur)
+        cur = [key, lo[i], hi[i]]
+    out.append(cur)
+    return np.array([(a, c, b, c) if h else (c, a, c, b) for (h, c), a, b in out], dtype=np.float64)
+
+def clip_rect(segs, u0, v0, u1, v1):
+    """Parte delle fughe dentro il rettangolo [u0, u1] x [v0, v1]."""
+    segs = as_segments(segs)
+    horiz = horizontal(segs)
+    a = np.clip(segs[:, [0, 1]], (u0, v0), (u1, v1))
+    b = np.clip(segs[:, [2, 3]], (u0, v0), (u1, v1))
+    inside = np.where(horiz, (segs[:, 1] >= v0) & (segs[:, 1] <= v1), (segs[:, 0] >= u0) & (segs[:, 0] <= u1))
+    keep = inside & (np.abs(b - a).sum(axis=1) > 0)
+    return np.hstack([a, b])[keep]
+
+def clip_rows(segments, v_min, v_max):
+    """Tiene solo la parte delle fughe compresa nella fascia v_min..v_max."""
+    segs = as_segments(segments)
+    horiz = horizontal(segs)
+    rows = segs[horiz & (segs[:, 1] > v_min) & (segs[:, 1] < v_max)]
+    cols = segs[~horiz].copy()
+    cols[:, 1] = np.maximum(cols[:, 1], v_min)
+    cols[:, 3] = np.minimum(cols[:, 3], v_max)
+    return np.vstack([rows, cols[cols[:, 3] > cols[:, 1]]])
+
+def clip_to_outline(segments, rings):
+    """Tiene la parte di ogni fuga interna ai contorni (regola pari/dispari,
+    quindi anche poligoni concavi o con fori)."""
+    segs = as_segments(segments)
+    edges = np.array([(ax, ay, bx, by) for ring in rings for (ax, ay), (bx, by) in zip(ring, ring[1:] + ring[:1])],
+                     dtype=np.float64).reshape(-1, 4)
+    if not len(segs) or not len(edges):
+        return segs
+    u0, v0 = segs[:, 0, None], segs[:, 1, None]
+    du, dv = (segs[:, 2] - segs[:, 0])[:, None], (segs[:, 3] - segs[:, 1])[:, None]
+    ax, ay = edges[:, 0], edges[:, 1]
+    ex, ey = edges[:, 2] - ax, edges[:, 3] - ay
+    den = du * ey - dv * ex
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s = ((ax - u0) * dv - (ay - v0) * du) / den
+        t = ((ax - u0) * ey - (ay - v0) * ex) / den
+    t = np.where((den != 0) & (s >= 0) & (s < 1), t, np.inf)
+    t.sort(axis=1)
+    count = np.isfinite(t).sum(axis=1)
+    # Caso degenere (conteggio dispari, fuga su un vertice): meglio non tagliarla
+    odd = count % 2 == 1
+    if t.shape[1] % 2:
+        t = np.hstack([t, np.full((len(t), 1), np.inf)])
+    a, b = np.clip(t[:, 0::2], 0.0, 1.0), np.clip(t[:, 1::2], 0.0, 1.0)
+    keep = np.isfinite(t[:, 1::2]) & (b > a) & ~odd[:, None]
+    row, col = np.nonzero(keep)
+    a, b = a[row, col], b[row, col]
+    pieces = np.column_stack([segs[row, 0] + a * du[row, 0], segs[row, 1] + a * dv[row, 0],
+                              segs[row, 0] + b * du[row, 0], segs[row, 1] + b * dv[row, 0]])
+    # Stesso ordine delle fughe di partenza
+    rows = np.concatenate([np.nonzero(odd)[0], row])
+    return np.vstack([segs[odd], pieces])[np.argsort(rows, kind="stable")]
+
+# --- PROFILO REALE DELLE FIANCATE ---
+# Il profilo è la polilinea del bordo superiore di una fiancata, [(u, h), ...]
+# con u crescente: le fughe che cadono sopra vengono scartate o accorciate
+# prima del boolean (rampe, hubba, transizioni).
+
+def profile_height(profile, u):
+    """Altezza del profilo in u (None fuori dal profilo)."""
+    for (ua, ha), (ub, hb) in zip(profile, profile[1:]):
+        if ua <= u <= ub:
+            return ha if ub == ua else ha + (hb - ha) * (u - ua) / (ub - ua)
+    return None
+
+def _max_height(profile, a, b):
+    """Altezza massima del profilo nell'intervallo a..b (None se disgiunto)."""
+    a, b = max(a, profile[0][0]), min(b, profile[-1][0])
+    if a > b:
+        return None
+    heights = [h for u, h in profile if a < u < b]
+    return max(heights + [profile_height(profile, a), profile_height(profile, b)])
+
+def _intervals_above(profile, level):
+    """Intervalli di u in cui il profilo supera level; gli estremi che toccano
+    i bordi del profilo restano aperti (il margine delle fughe non cambia)."""
+    out = []
+    for (ua, ha), (ub, hb) in zip(profile, profile[1:]):
+        if ha <= level and hb <= level:
+            continue
+        a = ua if ha > level else ua + (ub - ua) * (level - ha) / (hb - ha)
+        b = ub if hb > level else ua + (ub - ua) * (level - ha) / (hb - ha)
+        if out and abs(out[-1][1] - a) < 1e-9:
+            out[-1][1] = b
+        else:
+            out.append([a, b])
+    for iv in out:
+        if iv[0] <= profile[0][0]: iv[0] = -math.inf
+        if iv[1] >= profile[-1][0]: iv[1] = math.inf
+    return out
+
+def clip_to_profile(segments, profile, pad):
+    """Taglia le fughe sul profilo lasciando pad di sicurezza oltre il bordo.
+    Gli intervalli sopra ogni quota sono calcolati una volta per corso."""
+    out = []
+    intervals = {}
+    for u0, v0, u1, v1 in as_segments(segments).tolist():
+        if v0 == v1:
+            if v0 not in intervals:
+                intervals[v0] = _intervals_above(profile, v0 - pad)
+            for a, b in intervals[v0]:
+                a, b = max(u0, a - pad), min(u1, b + pad)
+                if b > a:
+                    out.append((a, v0, b, v1))
+        else:
+            top = _max_height(profile, u0 - pad, u0 + pad)
+            if top is not None and top > v0:
+                out.append((u0, v0, u1, min(v1, top + pad)))
+    return as_segments(out)
+
+def drop_rows(groups, v_max):
+    """Toglie dai gruppi di facce le fughe orizzontali a quota >= v_max."""
+    out = []
+    for group in groups:
+        faces = []
+        for pl, segs in group:
+            segs = as_segments(segs)
+            faces.append((pl, segs[~horizontal(segs) | (segs[:, 1] < v_max)]))
+        out.append(faces)
+    return out
+
+def layout_key(groups):
+    """Disegno delle fughe in forma confrontabile (chiave degli stadi memorizzati)."""
+    return tuple(as_segments(segs).round(6).tobytes() for group in groups for _, segs in group)
+
+def chunk_edges(length, step):
+    """Quote dei tagli da 0 a length ogni step; l'avanzo più corto di mezzo
+    passo viene unito all'ultimo riquadro."""
+    n = max(1, int(length / step + 0.5)) if step > 0 else 1
+    return [i * step for i in range(n)] + [length]
+
+def bands(segments, size):
+    """Fughe divise in fasce orizzontali [k*size, (k+1)*size): le orizzontali
+    vanno nella fascia della propria quota, le verticali vengono spezzate ai
+    bordi delle fasce. Ritorna [(v0, v1, segmenti), ...] per le sole fasce non
+    vuote; le fasce sono allineate a 0, quindi facce diverse hanno le stesse."""
+    segs = as_segments(segments)
+    if not len(segs):
+        return []
+    horiz = horizontal(segs)
+    low, high = np.minimum(segs[:, 1], segs[:, 3]), np.maximum(segs[:, 1], segs[:, 3])
+    if size <= 0:
+        return [(float(low.min()), float(high.max()), segs)]
+    rows, cols = segs[horiz], segs[~horiz].copy()
+    cols[:, 1], cols[:, 3] = low[~horiz], high[~horiz]
+    index = np.floor(rows[:, 1] / size)
+    out = []
+    for k in range(int(np.floor(low.min() / size)), int(np.floor(high.max() / size)) + 1):
+        v0, v1 = k * size, (k + 1) * size
+        part = cols.copy()
+        part[:, 1] = np.maximum(part[:, 1], v0)
+        part[:, 3] = np.minimum(part[:, 3], v1)
+        part = np.vstack([rows[index == k], part[part[:, 3] > part[:, 1]]])
+        if len(part):
+            out.append((float(v0), float(v1), part))
+    return out
@@ -0,0 +1,70 @@
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    import Part  # type: ignore
+else:
+    try:
+        import Part
+    except Exception:
+        Part = None
+
+import profiling
+
+# Unione per la stampa: gli ostacoli vengono raggruppati in base al contatto
+# reale e ogni gruppo è fuso con un solo booleano a più argomenti. I box
+# (AABB) scartano subito le coppie lontane, la distanza esatta viene
+# calcolata solo per quelle rimaste. Nessuna dipendenza dalla GUI.
+
+CONTACT_TOLERANCE = 0.01 # mm, distanza sotto cui due forme si toccano
+
+def _boxes(shapes, tol):
+    out = []
+    for s in shapes:
+        b = s.BoundBox
+        out.append((b.XMin - tol, b.XMax + tol, b.YMin - tol, b.YMax + tol, b.ZMin - tol, b.ZMax + tol))
+    return out
+
+def box_pairs(boxes):
+    """Coppie di indici con box sovrapposti (sweep and prune lungo X)."""
+    order = sorted(range(len(boxes)), key=lambda i: boxes[i][0])
+    active, pairs = [], []
+    for i in order:
+        x0, _, y0, y1, z0, z1 = boxes[i]
+        active = [j for j in active if boxes[j][1] >= x0]
+        for j in active:
+            b = boxes[j]
+            if b[2] <= y1 and y0 <= b[3] and b[4] <= z1 and z0 <= b[5]:
+                pairs.append((j, i) if j < i else (i, j))
+        active.append(i)
+    return pairs
+
+def touching_pairs(shapes, tol=CONTACT_TOLERANCE):
+    """Coppie di forme che si toccano o si compenetrano."""
+    return [(i, j) for i, j in box_pairs(_boxes(shapes, tol))
+            if shapes[i].distToShape(shapes[j])[0] <= tol]
+
+def clusters(n, pairs):
+    """Componenti connesse (union-find) come liste di indici ordinate."""
+    parent = list(range(n))
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    for i, j in pairs:
+        ri, rj = root(i), root(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+    groups = {}
+    for i in range(n):
+        groups.setdefault(root(i), []).append(i)
+    return sorted(groups.values())
+
+def fuse(shapes):
+    """Un solo booleano per tutto il gruppo."""
+    if len(shapes) == 1:
+        return shapes[0].copy()
+    with profiling.phase("merge.fuse"):
+        fused = shapes[0].multiFuse(shapes[1:])
+    with profiling.phase("merge.clean"):
+        fused = fused.removeSplitter()
+    return fused.Solids[0] if len(fused.Solids) == 1 else fused
@@ -0,0 +1,123 @@
+import cProfile
+import csv
+import io
+import os
+import pstats
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    import FreeCAD as fc  # type: ignore
+else:
+    try:
+        import FreeCAD as fc
+    except Exception:
+        fc = None
+
+# Misura dei tempi per fase durante il ricalcolo degli ostacoli.
+# Le fasi (phase) vengono registrate solo dentro una sessione attiva, quindi
+# con la profilazione spenta il costo è quello di un context manager vuoto.
+# Fasi con "." nel nome (es. "texture.cut") sono parti di una fase più ampia;
+# "base" è il tempo non coperto dalle altre fasi (solido di partenza).
+
+PARAM_PATH = "User parameter:BaseApp/Preferences/Mod/FingerboardParkPro"
+PROPERTY_GROUP = "Profilo"
+
+forced = False # Attivata da profile_recompute indipendentemente dalle preferenze
+_stack = []
+
+def enabled():
+    return forced or (fc is not None and fc.ParamGet(PARAM_PATH).GetBool("Profiling", False))
+
+@contextmanager
+def phase(name):
+    timings = _stack[-1] if _stack else None
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - t0
+
+@contextmanager
+def session():
+    """Raccoglie i tempi (secondi) delle fasi eseguite all'interno."""
+    timings = {}
+    _stack.append(timings)
+    t0 = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        _stack.pop()
+        total = time.perf_counter() - t0
+        timings["base"] = max(0.0, total - sum(v for k, v in timings.items() if "." not in k))
+        timings["total"] = total
+
+def store(fp, timings):
+    """Scrive i tempi sull'oggetto come proprietà di sola lettura (ms)."""
+    if not hasattr(fp, "RecomputeTime"):
+        fp.addProperty("App::PropertyFloat", "RecomputeTime", PROPERTY_GROUP, "Durata dell'ultimo ricalcolo (ms)", 8, True)
+        fp.addProperty("App::PropertyMap", "PhaseTimes", PROPERTY_GROUP, "Durata delle fasi dell'ultimo ricalcolo (ms)", 8, True)
+    fp.RecomputeTime = round(timings["total"] * 1000, 2)
+    fp.PhaseTimes = {k: f"{v * 1000:.2f}" for k, v in timings.items() if k != "total"}
+
+def format_timings(timings):
+    parts = [f"{k} {v * 1000:.1f}" for k, v in sorted(timings.items(), key=lambda kv: -kv[1]) if k != "total"]
+    return f"{timings['total'] * 1000:.1f} ms ({', '.join(parts)})"
+
+def rows(doc):
+    """Una riga per ostacolo profilato: (label, classe, totale ms, {fase: ms})."""
+    out = []
+    for obj in doc.Objects:
+        if hasattr(obj, "RecomputeTime") and hasattr(obj, "Proxy"):
+            phases = {k: float(v) for k, v in obj.PhaseTimes.items()}
+            out.append((obj.Label, type(obj.Proxy).__name__, obj.RecomputeTime, phases))
+    out.sort(key=lambda r: -r[2])
+    return out
+
+def report(doc, path=None):
+    """Stampa il riepilogo del documento in console e, se indicato, lo salva in CSV."""
+    table = rows(doc)
+    if not table:
+        fc.Console.PrintMessage("Nessun tempo registrato: attiva la profilazione e ricalcola.\n")
+        return table
+    phases = sorted({k for _, _, _, p in table for k in p})
+    total = sum(r[2] for r in table)
+    fc.Console.PrintMessage(f"Profilo ricalcolo: {len(table)} ostacoli, {total:.1f} ms\n")
+    for label, cls, ms, p in table:
+        detail = ", ".join(f"{k} {p[k]:.1f}" for k in phases if p.get(k))
+        fc.Console.PrintMessage(f"  {label:24} {cls:16} {ms:9.1f} ms  {detail}\n")
+    if path:
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(["label", "class", "total_ms"] + phases)
+            for label, cls, ms, p in table:
+                w.writerow([label, cls, ms] + [p.get(k, 0.0) for k in phases])
+        fc.Console.PrintMessage(f"Profilo salvato in {path}\n")
+    return table
+
+def profile_recompute(doc, objs, top=30):
+    """Ricalcola objs sotto cProfile, senza cache forme né stadi memorizzati e con i tempi per fase
+    attivi. Salva .prof e .csv in una cartella temporanea e ritorna il percorso."""
+    global forced
+    import shape_cache
+    out_dir = tempfile.mkdtemp(prefix="fbprofile_")
+    prof = cProfile.Profile()
+    forced, shape_cache.bypass = True, True
+    try:
+        for obj in objs:
+            obj.Proxy.clear_stages()
+            obj.touch()
+        prof.enable()
+        doc.recompute()
+    finally:
+        prof.disable()
+        forced, shape_cache.bypass = False, False
+    prof.dump_stats(os.path.join(out_dir, "recompute.prof"))
+    stream = io.StringIO()
+    pstats.Stats(prof, stream=stream).sort_stats("cumulative").print_stats(top)
+    fc.Console.PrintMessage(stream.getvalue())
+    report(doc, os.path.join(out_dir, "recompute.csv"))
+    fc.Console.PrintMessage(f"cProfile salvato in {os.path.join(out_dir, 'recompute.prof')}\n")
+    return out_dir
@@ -0,0 +1,192 @@
+import importlib
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    import FreeCAD as fc  # type: ignore
+else:
+    try:
+        import FreeCAD as fc
+    except Exception:
+        fc = None
+
+# Catalogo degli ostacoli e dei comandi del workbench.
+# Le classi degli ostacoli si registrano da sole con @obstacle (icona, menu,
+# valori di default); il catalogo viene salvato in un file manifest, così
+# all'avvio non serve importare features né i pacchetti di terze parti: i
+# moduli vengono letti solo se sono cambiati. I comandi vengono registrati con
+# proxy leggeri che importano commands/features al primo utilizzo.
+#
+# Pacchetti di ostacoli esterni: un modulo importabile che usa @obstacle,
+# indicato nella preferenza "ObstaclePacks" (nomi separati da virgola) o
+# aggiunto con add_pack() prima che il workbench venga attivato.
+
+PARAM_PATH = "User parameter:BaseApp/Preferences/Mod/FingerboardParkPro"
+MODDIR = os.path.dirname(os.path.abspath(__file__))
+ICONDIR = os.path.join(MODDIR, "icons")
+BUILTIN_MODULES = ["features"]
+
+_obstacles = {} # nome -> voce del catalogo (solo dati serializzabili)
+_classes = {}   # nome -> classe, per i moduli già importati
+_packs = []
+
+def obstacle(name, menu, icon, command=None, tooltip="", order=100, **defaults):
+    """Decoratore di registrazione. icon: file nella cartella icons/ del
+    modulo (o percorso assoluto); defaults: valori delle proprietà applicati
+    quando l'ostacolo viene creato dalla barra strumenti."""
+    def register(cls):
+        module = sys.modules[cls.__module__]
+        path = icon if os.path.isabs(icon) else os.path.join(os.path.dirname(os.path.abspath(module.__file__)), "icons", icon)
+        _obstacles[name] = {"name": name, "command": command or f"FB_{name}", "menu": menu, "tooltip": tooltip,
+                            "icon": path, "module": cls.__module__, "cls": cls.__name__, "order": order, "defaults": defaults}
+        _classes[name] = cls
+        return cls
+    return register
+
+def add_pack(module_name):
+    if module_name not in _packs:
+        _packs.append(module_name)
+
+def modules():
+    packs = fc.ParamGet(PARAM_PATH).GetString("ObstaclePacks", "") if fc is not None else ""
+    names = BUILTIN_MODULES + _packs + [p.strip() for p in packs.split(",") if p.strip()]
+    return list(dict.fromkeys(names))
+
+def _stamp(module_name):
+    spec = importlib.util.find_spec(module_name)
+    return os.path.getmtime(spec.origin) if spec is not None and spec.origin else None
+
+def _manifest_path():
+    base = fc.getUserCachePath() if hasattr(fc, "getUserCachePath") else fc.getUserAppDataDir()
+    return os.path.join(base, "FingerboardParkPro", "catalogue.json")
+
+def _load(module_name):
+    try:
+        importlib.import_module(module_name)
+        return True
+    except Exception as e:
+        fc.Console.PrintWarning(f"Pacchetto ostacoli '{module_name}' non caricato: {e}\n")
+        return False
+
+def catalogue():
+    """Voci degli ostacoli in ordine di barra strumenti. Dal manifest se i
+    moduli non sono cambiati, altrimenti importandoli (e aggiornandolo)."""
+    stamps = {m: _stamp(m) for m in modules()}
+    path = _manifest_path()
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("modules") == stamps:
+            return data["obstacles"]
+    except (OSError, ValueError):
+        pass
+    loaded = [m for m in stamps if _load(m)]
+    entries = sorted((e for e in _obstacles.values() if e["module"] in loaded), key=lambda e: e["order"])
+    # Anche i pacchetti non caricati restano nel manifest con il loro mtime:
+    # un pacchetto rotto non viene reimportato a ogni avvio, solo quando cambia.
+    # File temporaneo univoco: più worker possono riscrivere il manifest insieme.
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"modules": stamps, "obstacles": entries}, f, indent=1)
+            os.replace(tmp, path)
+        except OSError:
+            os.remove(tmp)
+            raise
+    except OSError:
+        pass
+    return entries
+
+def obstacle_class(name):
+    """Classe di un ostacolo per nome di catalogo (es. "Ledge") o di classe
+    (es. "FB_Ledge"); importa il modulo che la definisce se serve."""
+    for entry in list(_obstacles.values()) or catalogue():
+        if name in (entry["name"], entry["cls"]):
+            break
+    else:
+        entry = next((e for e in catalogue() if name in (e["name"], e["cls"])), None)
+        if entry is None:
+            raise KeyError(f"Tipo di ostacolo sconosciuto: {name}")
+    if entry["name"] not in _classes:
+        importlib.import_module(entry["module"])
+    return _classes[entry["name"]]
+
+def classes():
+    return {e["name"]: _classes[e["name"]] for e in sorted(_obstacles.values(), key=lambda e: e["order"])}
+
+# --- COMANDI ---
+
+# Strumenti del workbench: (comando, classe in commands.py, risorse)
+TOOLS = [
+    ("FB_Proxy", "CmdCreateSplitProxy", {
+        'MenuText': '1. Crea Piano con Mirino', 'Pixmap': 'FB_Proxy.svg',
+        'ToolTip': 'Il centro della croce indica dove nascerà il perno'}),
+    ("FB_SplitConfirm", "CmdConfirmSplit", {
+        'MenuText': '2. Conferma Split', 'Pixmap': 'FB_SplitConfirm.svg',
+        'ToolTip': 'Taglia e inserisce il perno al centro del mirino; con più piani selezionati taglia tutto in un passaggio e mette un perno su ogni faccia di taglio'}),
+    ("FB_SplitGrid", "CmdGridSplit", {
+        'MenuText': 'Split a Griglia', 'Pixmap': 'FB_SplitGrid.svg',
+        'ToolTip': "Divide l'ostacolo selezionato in una griglia di pezzi uguali (X,Y,Z) con perni su ogni taglio"}),
+    ("FB_SplitAuto", "CmdAutoSplit", {
+        'MenuText': 'Split per Piatto di Stampa', 'Pixmap': 'FB_SplitAuto.svg',
+        'ToolTip': "Calcola i tagli minimi perché ogni pezzo dell'ostacolo selezionato entri nel piatto, lontano dalle fughe, e li esegue con i perni"}),
+    ("FB_Merge", "CmdMerge", {
+        'MenuText': 'Unisci per Stampa', 'Pixmap': 'FB_Merge.svg',
+        'ToolTip': 'Unisce gli oggetti selezionati (o tutti quelli visibili) che si toccano: un solido per ogni gruppo connesso'}),
+    ("FB_ExportSTL", "CmdExportPark", {
+        'MenuText': 'Esporta STL Parco', 'Pixmap': 'FB_ExportSTL.svg',
+        'ToolTip': 'Esporta gli oggetti selezionati (o tutti quelli visibili) in un unico STL binario, tessellando in parallelo con cache delle mesh'}),
+    ("FB_Bake", "CmdBake", {'MenuText': 'Crea Body', 'Pixmap': 'FB_Bake.svg'}),
+    ("FB_TextureToggle", "CmdTextureToggle", {
+        'MenuText': 'Livello di Dettaglio (Block-out / Preview / Export)', 'Pixmap': 'FB_TextureToggle.svg',
+        'ToolTip': 'Passa al livello di dettaglio successivo per tutto il documento (gli oggetti con LOD proprio o LockTexture sono ignorati)'}),
+    ("FB_Recompute", "CmdRecomputePark", {
+        'MenuText': 'Ricalcola Parco (multi-core)', 'Pixmap': 'FB_Recompute.svg',
+        'ToolTip': 'Ricostruisce tutti gli ostacoli in parallelo su più processi FreeCADCmd'}),
+    ("FB_Profile", "CmdProfile", {
+        'MenuText': 'Profila Ricalcolo', 'Pixmap': 'FB_Profile.svg',
+        'ToolTip': 'Ricalcola gli ostacoli selezionati (o tutti) sotto cProfile e stampa i tempi per fase; i file .prof e .csv finiscono in una cartella temporanea'}),
+]
+
+class LazyCommand:
+    """Comando con risorse statiche: commands.py viene importato, e la classe
+    istanziata, solo quando il comando viene usato la prima volta."""
+    def __init__(self, cls_name, resources):
+        self.cls_name, self.resources, self._cmd = cls_name, resources, None
+
+    def GetResources(self):
+        return dict(self.resources, Pixmap=os.path.join(ICONDIR, self.resources['Pixmap']))
+
+    def Activated(self):
+        if self._cmd is None:
+            import commands
+            self._cmd = getattr(commands, self.cls_name)()
+        self._cmd.Activated()
+
+class ObstacleCommand:
+    def __init__(self, entry):
+        self.entry = entry
+
+    def GetResources(self):
+        return {'MenuText': self.entry["menu"], 'Pixmap': self.entry["icon"], 'ToolTip': self.entry["tooltip"]}
+
+    def Activated(self):
+        import commands
+        commands.setup_obj(self.entry["name"], obstacle_class(self.entry["name"]), self.entry["defaults"])
+
+def install():
+    """Registra i comandi in FreeCADGui e ritorna la lista per la barra strumenti."""
+    import FreeCADGui as fcg
+    names = []
+    for entry in catalogue():
+        fcg.addCommand(entry["command"], ObstacleCommand(entry))
+        names.append(entry["command"])
+    for name, cls_name, resources in TOOLS:
+        fcg.addCommand(name, LazyCommand(cls_name, resources))
+        names.append(name)
+    return names
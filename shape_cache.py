@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    import FreeCAD as fc  # type: ignore
+    import Part  # type: ignore
+else:
+    try:
+        import FreeCAD as fc
+        import Part
+    except Exception:
+        fc = None
+        Part = None
+
+import brick_utils
+import profiling
+
+# Cache a due livelli delle forme degli ostacoli:
+# 1. LRU in memoria (ritorno immediato durante la sessione)
+# 2. file BREP su disco (sopravvive a riaperture e riavvii)
+# La chiave è l'hash di classe + proprietà geometriche + versione workbench.
+
+MEMORY_SIZE = 32
+DISK_MAX_ENTRIES = 500
+PARAM_PATH = "User parameter:BaseApp/Preferences/Mod/FingerboardParkPro"
+
+# Proprietà che non cambiano la geometria
+IGNORED_PROPERTIES = {"Visibility", "LockTexture", "LOD", "RecomputeTime", "StoreShape"}
+GEOMETRY_TYPES = (
+    "App::PropertyLength", "App::PropertyDistance", "App::PropertyFloat",
+    "App::PropertyAngle", "App::PropertyInteger", "App::PropertyBool",
+    "App::PropertyEnumeration",
+)
+
+_memory = OrderedDict()
+bypass = False # Ignora la cache (es. profilazione)
+
+def _read_version():
+    try:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "package.xml"), encoding="utf-8") as f:
+            m = re.search(r"<version>(.*?)</version>", f.read())
+            return m.group(1) if m else "dev"
+    except OSError:
+        return "dev"
+
+VERSION = _read_version()
+
+def _params():
+    return fc.ParamGet(PARAM_PATH) if fc is not None else None
+
+def enabled():
+    if bypass:
+        return False
+    p = _params()
+    return p is None or p.GetBool("ShapeCache", True)
+
+def disk_enabled():
+    p = _params()
+    return p is None or p.GetBool("ShapeCacheDisk", True)
+
+def cache_dir():
+    base = fc.getUserCachePath() if hasattr(fc, "getUserCachePath") else fc.getUserAppDataDir()
+    path = os.path.join(base, "FingerboardParkPro", "shapes")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def geometry_params(fp):
+    """Valori (serializzabili) di tutte le proprietà che influenzano la forma."""
+    params = {}
+    for name in fp.PropertiesList:
+        if name in IGNORED_PROPERTIES:
+            continue
+        if fp.getTypeIdOfProperty(name) not in GEOMETRY_TYPES:
+            continue
+        value = getattr(fp, name)
+        params[name] = getattr(value, "Value", value)
+    return params
+
+def shape_key(fp):
+    cls = type(fp.Proxy).__name__
+    payload = json.dumps([cls, VERSION, brick_utils.TEXTURE_ENGINE, brick_utils.TEXTURE_REVISION, geometry_params(fp)], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def get(key):
+    with profiling.phase("cache"):
+        return _get(key)
+
+def _get(key):
+    shape = _memory.get(key)
+    if shape is not None:
+        _memory.move_to_end(key)
+        return shape
+    if not disk_enabled():
+        return None
+    path = os.path.join(cache_dir(), key + ".brep")
+    if not os.path.exists(path):
+        return None
+    try:
+        shape = Part.Shape()
+        shape.importBrep(path)
+    except Exception:
+        return None
+    if shape.isNull():
+        return None
+    os.utime(path)
+    _remember(key, shape)
+    return shape
+
+def put(key, shape):
+    with profiling.phase("cache"):
+        _put(key, shape)
+
+def _put(key, shape):
+    _remember(key, shape)
+    if not disk_enabled():
+        return
+    path = os.path.join(cache_dir(), key + ".brep")
+    tmp = path + ".tmp"
+    try:
+        shape.exportBrep(tmp)
+        os.replace(tmp, path)
+    except Exception as e:
+        fc.Console.PrintWarning(f"Cache forme: impossibile salvare {key}: {e}\n")
+        return
+    _prune_disk()
+
+def _remember(key, shape):
+    _memory[key] = shape
+    _memory.move_to_end(key)
+    while len(_memory) > MEMORY_SIZE:
+        _memory.popitem(last=False)
+
+def _prune_disk():
+    folder = cache_dir()
+    files = [os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(".brep")]
+    if len(files) <= DISK_MAX_ENTRIES:
+        return
+    files.sort(key=os.path.getmtime)
+    for f in files[:len(files) - DISK_MAX_ENTRIES]:
+        try: os.remove(f)
+        except OSError: pass
+
+def clear(disk=False):
+    _memory.clear()
+    if disk:
+        folder = cache_dir()
+        for f in os.listdir(folder):
+            if f.endswith(".brep"):
+                try: os.remove(os.path.join(folder, f))
+                except OSError: pass
+
+def fetch(fp, build):
+    """Ritorna la forma dell'oggetto dalla cache, oppure la costruisce con build(fp)."""
+    if not enabled():
+        return build(fp)
+    key = shape_key(fp)
+    shape = get(key)
+    if shape is None:
+        shape = build(fp)
+        # Texture con fasce fallite: non va servita alla prossima apertura
+        if shape is not None and not shape.isNull() and not getattr(fp.Proxy, "_failed", None):
+            put(key, shape)
+    return shape
@@ -0,0 +1,240 @@
+import math
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    import FreeCAD as fc  # type: ignore
+    import Part  # type: ignore
+else:
+    try:
+        import FreeCAD as fc
+        import Part
+    except Exception:
+        fc = None
+        Part = None
+
+import profiling
+
+# Geometria dello split con perno: nessuna dipendenza dalla GUI, così può
+# girare anche nei worker FreeCADCmd.
+
+TOLERANCE = 0.2 # Tolleranza per il taglio
+JOINT_W, JOINT_L, JOINT_H = 5.0, 3.0, 30.0 # Dimensioni fisse del giunto
+CHAMFER = 1.5 # Smusso
+
+def make_joint(w, l, h, c, t=0):
+    # Crea il box centrato sul suo 0,0,0
+    j = Part.makeBox(l + t, w + t, h + t)
+    j.translate(fc.Vector(-(l+t)/2, -(w+t)/2, -(h+t)/2))
+    if c > 0: j = j.makeChamfer(c, j.Edges)
+    return j
+
+def split_by_proxy(shape, placement, report=None):
+    """Divide shape sul piano del proxy (asse X locale) e ritorna (part_a, part_b)
+    con il perno maschio su A e la sede femmina su B."""
+    report = report or (lambda msg: None)
+
+    # 1. Volume di taglio basato sul piano del Proxy
+    bbox = shape.BoundBox
+    c_size = max(bbox.XLength, bbox.YLength, bbox.ZLength) * 2
+
+    cutter_vol = Part.makeBox(c_size, c_size, c_size)
+    cutter_vol.Placement = placement
+    # Spostiamo il volume in modo che la faccia coincida con lo 0 del proxy
+    cutter_vol.translate(placement.Rotation.multVec(fc.Vector(-c_size, -c_size/2, -c_size/2)))
+
+    with profiling.phase("split.cut"):
+        report("parte A")
+        part_a = shape.common(cutter_vol)
+        report("parte B")
+        part_b = shape.cut(cutter_vol)
+
+    # 2. Creazione Giunti Smussati (Joints)
+    pin = make_joint(JOINT_W, JOINT_L, JOINT_H, CHAMFER)
+    hole = make_joint(JOINT_W, JOINT_L, JOINT_H, CHAMFER, TOLERANCE)
+
+    # Il perno prende ESATTAMENTE il placement del proxy.
+    # Siccome il perno è creato centrato e il mirino è al centro del proxy,
+    # l'allineamento è matematicamente perfetto.
+    pin.Placement = placement
+    hole.Placement = placement
+
+    report("perni")
+    with profiling.phase("split.joint"):
+        return part_a.fuse(pin), part_b.cut(hole)
+
+def placement_to_list(placement):
+    return list(placement.Base) + list(placement.Rotation.Q)
+
+def placement_from_list(values):
+    return fc.Placement(fc.Vector(*values[:3]), fc.Rotation(*values[3:]))
+
+# --- SPLIT MULTIPLO ---
+# Tutti i piani vengono applicati in un solo passaggio (general fuse di
+# BOPTools) e i perni nascono su ogni faccia di taglio condivisa tra due pezzi.
+# Il piano di ogni proxy è il suo asse X locale, come in split_by_proxy: il
+# pezzo dal lato negativo riceve il perno, quello dal lato positivo la sede.
+
+MIN_SHARED_AREA = 1.0 # mm², facce di contatto più piccole vengono ignorate
+
+def plane_face(placement, size):
+    """Faccia quadrata di lato 2*size sul piano del proxy."""
+    pts = [fc.Vector(0, -size, -size), fc.Vector(0, size, -size), fc.Vector(0, size, size), fc.Vector(0, -size, size)]
+    face = Part.Face(Part.makePolygon(pts + [pts[0]]))
+    face.Placement = placement
+    return face
+
+AXES = "XYZ"
+
+def axis_normal(axis):
+    return fc.Vector(*[1 if a == axis else 0 for a in AXES])
+
+def axis_placement(axis, coord, point):
+    """Piano perpendicolare ad axis alla quota coord, con il mirino in point."""
+    rot = {"X": fc.Rotation(), "Y": fc.Rotation(fc.Vector(0, 0, 1), 90), "Z": fc.Rotation(fc.Vector(0, 1, 0), -90)}[axis]
+    base = fc.Vector(point)
+    setattr(base, axis.lower(), coord)
+    return fc.Placement(base, rot)
+
+def grid_placements(bbox, nx=1, ny=1, nz=1):
+    """Piani equidistanti che dividono bbox in nx x ny x nz blocchi."""
+    out = []
+    for axis, n in zip(AXES, (nx, ny, nz)):
+        lo, length = getattr(bbox, axis + "Min"), getattr(bbox, axis + "Length")
+        for i in range(1, max(n, 1)):
+            out.append(axis_placement(axis, lo + length * i / n, bbox.Center))
+    return out
+
+def _on_plane(face, base, normal, tol=1e-4):
+    return isinstance(face.Surface, Part.Plane) and all(abs((v.Point - base).dot(normal)) < tol for v in face.Vertexes)
+
+def _joint_fits(face, placement, tol=0.0):
+    """Vero se la sezione del giunto (più tolleranza) sta tutta dentro la faccia."""
+    hw, hh = (JOINT_W + tol) / 2, (JOINT_H + tol) / 2
+    pts = [placement.multVec(fc.Vector(0, y, z)) for y, z in ((0, 0), (-hw, -hh), (hw, -hh), (hw, hh), (-hw, hh))]
+    return all(face.isInside(p, 1e-3, True) for p in pts)
+
+def _placed_joint(placement, t=0):
+    j = make_joint(JOINT_W, JOINT_L, JOINT_H, CHAMFER, t)
+    j.Placement = placement
+    return j
+
+def split_by_planes(shape, placements, report=None):
+    """Divide shape con tutti i piani in un colpo solo e ritorna la lista dei
+    pezzi, ordinati per lato rispetto ai piani (negativo prima)."""
+    from BOPTools import SplitAPI
+    report = report or (lambda msg: None)
+    bbox = shape.BoundBox
+    size = bbox.DiagonalLength + max(pl.Base.distanceToPoint(bbox.Center) for pl in placements)
+    normals = [pl.Rotation.multVec(fc.Vector(1, 0, 0)) for pl in placements]
+
+    with profiling.phase("split.cut"):
+        report(f"taglio con {len(placements)} piani")
+        pieces = SplitAPI.slice(shape, [plane_face(pl, size) for pl in placements], "Split").Solids
+    sides = [[(p.CenterOfMass - pl.Base).dot(n) for pl, n in zip(placements, normals)] for p in pieces]
+    order = sorted(range(len(pieces)), key=lambda i: [round(s, 3) for s in sides[i]])
+    pieces, sides = [pieces[i] for i in order], [sides[i] for i in order]
+
+    pins = [[] for _ in pieces]
+    holes = [[] for _ in pieces]
+    with profiling.phase("split.joint"):
+        for k, (pl, n) in enumerate(zip(placements, normals)):
+            report(f"perni piano {k + 1}/{len(placements)}")
+            faces = [[f for f in p.Faces if _on_plane(f, pl.Base, n)] for p in pieces]
+            for i in range(len(pieces)):
+                for j in range(len(pieces)):
+                    if not (sides[i][k] < 0 < sides[j][k] and faces[i] and faces[j]):
+                        continue
+                    for fi in faces[i]:
+                        for fj in faces[j]:
+                            for shared in fi.common(fj).Faces:
+                                if shared.Area < MIN_SHARED_AREA:
+                                    continue
+                                # Il mirino del proxy se cade sulla faccia, altrimenti il suo baricentro
+                                at = fc.Placement(pl.Base, pl.Rotation)
+                                if not _joint_fits(shared, at, TOLERANCE):
+                                    at = fc.Placement(shared.CenterOfMass, pl.Rotation)
+                                if not _joint_fits(shared, at, TOLERANCE):
+                                    report(f"faccia di taglio troppo piccola per il perno (piano {k + 1})")
+                                    continue
+                                pins[i].append(_placed_joint(at))
+                                holes[j].append(_placed_joint(at, TOLERANCE))
+
+        out = []
+        for piece, p, h in zip(pieces, pins, holes):
+            if p:
+                piece = piece.multiFuse(p)
+            if h:
+                piece = piece.cut(Part.makeCompound(h))
+            out.append(piece)
+    return out
+
+# --- PIANIFICAZIONE PER IL PIATTO DI STAMPA ---
+# Numero minimo di tagli per asse dalle misure del bounding box, poi ogni
+# taglio viene spostato nella sua finestra ammessa scegliendo, con sole
+# sezioni (shape.slice, niente boolean), la quota che non corre lungo una
+# fuga, lascia posto al perno e ha la sezione più piena (niente pareti sottili).
+
+PLAN_SAMPLES = 15 # Quote provate per ogni taglio
+GROOVE_CLEARANCE = 2.0 # Distanza minima tra il piano e una fuga parallela
+BED_MARGIN = 1.0 # Margine sul piatto oltre alla sporgenza del perno
+
+def section_faces(shape, axis, coord):
+    try:
+        wires = shape.slice(axis_normal(axis), coord)
+        if not wires:
+            return []
+        return Part.makeFace(wires, "Part::FaceMakerBullseye").Faces
+    except Exception:
+        return []
+
+def _runs_along_groove(lines, axis, coord):
+    a = axis.lower()
+    return any(abs(getattr(p0, a) - coord) < GROOVE_CLEARANCE and abs(getattr(p1, a) - coord) < GROOVE_CLEARANCE for p0, p1 in lines)
+
+def _cut_candidate(shape, axis, coord, lines):
+    faces = section_faces(shape, axis, coord)
+    area = sum(f.Area for f in faces)
+    fits = not faces or any(_joint_fits(f, fc.Placement(f.CenterOfMass, axis_placement(axis, coord, f.CenterOfMass).Rotation), TOLERANCE) for f in faces)
+    return {"coord": coord, "area": area, "faces": faces, "fits": fits, "groove": _runs_along_groove(lines, axis, coord)}
+
+def piece_counts(size, bed):
+    """Pezzi per asse (X, Y, Z) perché ogni pezzo stia nel piatto; prova anche il piatto ruotato di 90°."""
+    usable = [b - JOINT_L - BED_MARGIN for b in bed]
+    if min(usable) <= 0:
+        raise ValueError("Piatto troppo piccolo per il perno")
+    options = []
+    for bx, by in ((usable[0], usable[1]), (usable[1], usable[0])):
+        lengths = (bx, by, usable[2])
+        counts = [max(1, math.ceil(s / b - 1e-9)) for s, b in zip(size, lengths)]
+        options.append((counts[0] * counts[1] * counts[2], counts, lengths))
+    _, counts, lengths = min(options, key=lambda o: o[0])
+    return counts, lengths
+
+def plan_axis(shape, axis, n, bed_len, lines=()):
+    """Quote dei n-1 tagli lungo axis: ogni pezzo resta entro bed_len."""
+    bb = shape.BoundBox
+    lo, hi = getattr(bb, axis + "Min"), getattr(bb, axis + "Max")
+    cuts, prev = [], lo
+    for k in range(1, n):
+        a, b = max(prev, hi - (n - k) * bed_len), min(prev + bed_len, hi)
+        ideal = min(max(lo + (hi - lo) * k / n, a), b)
+        coords = [a + (b - a) * (i + 0.5) / PLAN_SAMPLES for i in range(PLAN_SAMPLES)] if b - a > 1e-6 else [a]
+        cands = [_cut_candidate(shape, axis, c, lines) for c in coords + [ideal]]
+        top = max(c["area"] for c in cands) or 1.0
+        # Priorità: lontano dalle fughe, perno che entra, sezione piena, vicino alla divisione in parti uguali
+        best = max(cands, key=lambda c: (not c["groove"], c["fits"], round(c["area"] / top, 1), -abs(c["coord"] - ideal)))
+        cuts.append(best)
+        prev = best["coord"]
+    return cuts
+
+def plan_cuts(shape, bed, lines=()):
+    """Piani di taglio (Placement) perché ogni pezzo entri nel piatto bed = (X, Y, Z).
+    lines: fughe in coordinate globali [(p0, p1), ...] da non seguire col taglio."""
+    bb = shape.BoundBox
+    counts, lengths = piece_counts((bb.XLength, bb.YLength, bb.ZLength), bed)
+    placements = []
+    for axis, n, bed_len in zip(AXES, counts, lengths):
+        for cut in plan_axis(shape, axis, n, bed_len, lines):
+            # Mirino sul baricentro della sezione più grande: il perno cade sul pieno
+            point = max(cut["faces"], key=lambda f: f.Area).CenterOfMass if cut["faces"] else bb.Center
+            placements.append(axis_placement(axis, cut["coord"], point))
+    return placements
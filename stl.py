@@ -0,0 +1,103 @@
+import struct
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Scrittura STL binaria in streaming: i triangoli vengono accodati oggetto per
+# oggetto e il numero totale viene scritto nell'header alla chiusura.
+# Con numpy i record vengono calcolati e scritti in blocco, altrimenti uno
+# per uno con struct.
+
+HEADER = b"Fingerboard Park Pro binary STL".ljust(80, b" ")
+RECORD = struct.Struct("<12fH")
+DTYPE = np.dtype([("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)), ("attr", "<u2")]) if np is not None else None
+
+def _matrix(placement):
+    """Rotazione 3x3 (righe) e traslazione di un Placement."""
+    m = placement.toMatrix()
+    return ((m.A11, m.A12, m.A13), (m.A21, m.A22, m.A23), (m.A31, m.A32, m.A33)), (m.A14, m.A24, m.A34)
+
+def _records(points, facets):
+    """Array strutturato dei triangoli (normali calcolate dai vertici)."""
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    tri = pts[np.asarray(facets, dtype=np.int64).reshape(-1, 3)]
+    n = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    length = np.linalg.norm(n, axis=1, keepdims=True)
+    length[length == 0] = 1.0
+    rec = np.zeros(len(tri), dtype=DTYPE)
+    rec["normal"] = n / length
+    rec["vertices"] = tri
+    return rec
+
+class StlWriter:
+    def __init__(self, path):
+        self.count = 0
+        self._file = open(path, "wb")
+        self._file.write(HEADER)
+        self._file.write(struct.pack("<I", 0))
+
+    def add_shape(self, shape, deflection=0.05):
+        points, facets = shape.tessellate(deflection)
+        self.add_triangles([(p.x, p.y, p.z) for p in points], facets)
+
+    def add_triangles(self, points, facets):
+        if np is not None:
+            rec = _records(points, facets)
+            rec.tofile(self._file)
+            self.count += len(rec)
+            return
+        pack = RECORD.pack
+        write = self._file.write
+        for a, b, c in facets:
+            (ax, ay, az), (bx, by, bz), (cx, cy, cz) = points[a], points[b], points[c]
+            ux, uy, uz = bx - ax, by - ay, bz - az
+            vx, vy, vz = cx - ax, cy - ay, cz - az
+            nx, ny, nz = uy*vz - uz*vy, uz*vx - ux*vz, ux*vy - uy*vx
+            n = (nx*nx + ny*ny + nz*nz) ** 0.5 or 1.0
+            write(pack(nx/n, ny/n, nz/n, ax, ay, az, bx, by, bz, cx, cy, cz, 0))
+        self.count += len(facets)
+
+    def add_records(self, data, placement=None):
+        """Accoda record STL già pronti (es. da cache), spostati di placement."""
+        count = len(data) // RECORD.size
+        if placement is None or placement.isIdentity():
+            self._file.write(data)
+        elif np is not None:
+            rot, move = _matrix(placement)
+            rot, move = np.array(rot), np.array(move)
+            rec = np.frombuffer(data, dtype=DTYPE).copy()
+            rec["normal"] = rec["normal"] @ rot.T
+            rec["vertices"] = rec["vertices"] @ rot.T + move
+            rec.tofile(self._file)
+        else:
+            (r0, r1, r2), (tx, ty, tz) = _matrix(placement)
+            def tr(x, y, z, t=(tx, ty, tz)):
+                return tuple(r[0]*x + r[1]*y + r[2]*z + t[i] for i, r in enumerate((r0, r1, r2)))
+            write = self._file.write
+            for i in range(count):
+                v = RECORD.unpack_from(data, i * RECORD.size)
+                n = tr(*v[0:3], t=(0, 0, 0))
+                write(RECORD.pack(*n, *tr(*v[3:6]), *tr(*v[6:9]), *tr(*v[9:12]), 0))
+        self.count += count
+
+    def close(self):
+        self._file.seek(80)
+        self._file.write(struct.pack("<I", self.count))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def write_shape(path, shape, deflection=0.05):
+    with StlWriter(path) as w:
+        w.add_shape(shape, deflection)
+
+def read_records(path):
+    """Record dei triangoli di un STL binario (senza header e conteggio)."""
+    with open(path, "rb") as f:
+        f.seek(84)
+        return f.read()
@@ -0,0 +1,166 @@
+"""Disegni delle fughe (layout.py) confrontati con i vecchi cicli per mattone.
+
+layout.py usa solo numpy: questi test girano senza FreeCAD (python -m pytest).
+"""
+import math
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import layout
+
+# --- RIFERIMENTI: i cicli Python della versione precedente ---
+
+def old_brick_segments(width, height, bl, bh, margin=10.0, shift=None):
+    shift = bl / 2.0 if shift is None else shift
+    segs = []
+    rows = int(height / bh) + 1
+    for r in range(1, rows):
+        v = r * bh
+        if v < height:
+            segs.append((-margin, v, width + margin, v))
+    for r in range(rows):
+        v, s = r * bh, (0 if r % 2 == 0 else shift)
+        for i in range(int(width / bl) + 2):
+            u = (i * bl) + s
+            segs.append((u, v, u, v + bh))
+    return segs
+
+def old_clip_to_outline(segments, rings):
+    out = []
+    for u0, v0, u1, v1 in segments:
+        du, dv = u1 - u0, v1 - v0
+        ts = []
+        for ring in rings:
+            for (ax, ay), (bx, by) in zip(ring, ring[1:] + ring[:1]):
+                ex, ey = bx - ax, by - ay
+                den = du * ey - dv * ex
+                if den == 0:
+                    continue
+                s = ((ax - u0) * dv - (ay - v0) * du) / den
+                if 0 <= s < 1:
+                    ts.append(((ax - u0) * ey - (ay - v0) * ex) / den)
+        if len(ts) % 2:
+            out.append((u0, v0, u1, v1))
+            continue
+        ts.sort()
+        for a, b in zip(ts[0::2], ts[1::2]):
+            a, b = max(a, 0.0), min(b, 1.0)
+            if b > a:
+                out.append((u0 + a * du, v0 + a * dv, u0 + b * du, v0 + b * dv))
+    return out
+
+def herringbone_bricks(bl, bh, n=40):
+    L, W = max(bl, bh), min(bl, bh)
+    for k in range(-n, n):
+        for j in range(-n, n):
+            ox, oy = k * W + j * L, k * W - j * L
+            yield ox, oy, L, W
+            yield ox, oy + W, W, L
+
+def basket_bricks(bl, bh, n=20):
+    m = max(1, round(bl / bh))
+    cell = m * bh
+    for i in range(-n, n):
+        for j in range(-n, n):
+            x, y = i * cell, j * cell
+            for k in range(m):
+                if (i + j) % 2:
+                    yield x + k * bh, y, bh, cell
+                else:
+                    yield x, y + k * bh, cell, bh
+
+def edges_in_rect(bricks, width, height, margin):
+    """Lati dei mattoni, uniti sulla stessa retta e ritagliati sul paramento,
+    senza fughe orizzontali sul bordo inferiore e superiore."""
+    lines = {}
+    for x, y, w, h in bricks:
+        for key, a, b in ((("h", y), x, x + w), (("h", y + h), x, x + w),
+                          (("v", x), y, y + h), (("v", x + w), y, y + h)):
+            lines.setdefault((key[0], round(key[1], 6)), []).append((a, b))
+    out = set()
+    for (kind, c), spans in lines.items():
+        spans.sort()
+        merged = [list(spans[0])]
+        for a, b in spans[1:]:
+            if a <= merged[-1][1] + 1e-9:
+                merged[-1][1] = max(merged[-1][1], b)
+            else:
+                merged.append([a, b])
+        for a, b in merged:
+            if kind == "h":
+                if not 0 < c < height:
+                    continue
+                a, b = max(a, -margin), min(b, width + margin)
+                if b > a:
+                    out.add((round(a, 6), c, round(b, 6), c))
+            else:
+                if not -margin <= c <= width + margin:
+                    continue
+                a, b = max(a, 0.0), min(b, height)
+                if b > a:
+                    out.add((c, round(a, 6), c, round(b, 6)))
+    return out
+
+def as_set(segs):
+    return {tuple(s) for s in layout.as_segments(segs).round(6).tolist()}
+
+# --- PARAMENTI ---
+
+@pytest.mark.parametrize("width, height, bl, bh", [(120, 35, 20, 10), (50, 50, 10, 5), (33.3, 17.5, 7.5, 4.2)])
+def test_running_matches_old_loop(width, height, bl, bh):
+    expected = np.array(old_brick_segments(width, height, bl, bh))
+    np.testing.assert_allclose(layout.brick("Running", width, height, bl, bh), expected)
+
+@pytest.mark.parametrize("width, height, bl, bh", [(120, 35, 20, 10), (50, 50, 10, 5)])
+def test_stack_matches_old_loop_without_shift(width, height, bl, bh):
+    expected = np.array(old_brick_segments(width, height, bl, bh, shift=0.0))
+    np.testing.assert_allclose(layout.brick("Stack", width, height, bl, bh), expected)
+
+@pytest.mark.parametrize("bl, bh", [(20, 10), (10, 20), (15, 5)])
+def test_herringbone_matches_brick_loop(bl, bh):
+    width, height, margin = 120, 60, 10.0
+    expected = edges_in_rect(herringbone_bricks(bl, bh), width, height, margin)
+    assert as_set(layout.brick("Herringbone", width, height, bl, bh, margin)) == expected
+
+@pytest.mark.parametrize("bl, bh", [(20, 10), (30, 10)])
+def test_basket_matches_brick_loop(bl, bh):
+    width, height, margin = 120, 60, 10.0
+    expected = edges_in_rect(basket_bricks(bl, bh), width, height, margin)
+    assert as_set(layout.brick("Basket", width, height, bl, bh, margin)) == expected
+
+def test_layouts_are_read_only():
+    for pattern in layout.PATTERNS:
+        with pytest.raises(ValueError):
+            layout.brick(pattern, 100, 40, 20, 10)[0, 0] = 1.0
+
+# --- RITAGLIO SUL CONTORNO ---
+
+SQUARE = [(0.0, 0.0), (100.0, 0.0), (100.0, 100.0), (0.0, 100.0)]
+NOTCHED = [(0.0, 0.0), (100.0, 0.0), (100.0, 60.0), (60.0, 60.0), (60.0, 100.0), (0.0, 100.0)]
+HOLE = [(40.0, 40.0), (40.0, 20.0), (20.0, 20.0), (20.0, 40.0)]
+
+@pytest.mark.parametrize("rings", [[SQUARE], [NOTCHED], [NOTCHED, HOLE],
+                                   [[(50 + 45 * math.cos(a / 12 * math.pi), 50 + 45 * math.sin(a / 12 * math.pi)) for a in range(24)]]])
+def test_clip_to_outline_matches_old_loop(rings):
+    segs = layout.grid(100, 100, 12.5)
+    expected = np.array(old_clip_to_outline(segs.tolist(), rings)).reshape(-1, 4)
+    np.testing.assert_allclose(layout.clip_to_outline(segs, rings), expected)
+
+def test_clip_to_outline_segments_on_edges():
+    # Fughe che corrono esattamente sui lati del contorno (e una sul lato del gradino)
+    segs = [(-5.0, 0.0, 105.0, 0.0), (0.0, -5.0, 0.0, 105.0), (-5.0, 100.0, 105.0, 100.0),
+            (100.0, -5.0, 100.0, 105.0), (-5.0, 60.0, 105.0, 60.0), (60.0, -5.0, 60.0, 105.0)]
+    expected = np.array(old_clip_to_outline(segs, [NOTCHED])).reshape(-1, 4)
+    clipped = layout.clip_to_outline(segs, [NOTCHED])
+    np.testing.assert_allclose(clipped, expected)
+    # Nessuna fuga sul bordo sparisce: al più resta intera (caso degenere)
+    assert {s[1] for s in clipped.tolist() if s[1] == s[3]} >= {0.0, 100.0, 60.0}
+
+def test_clip_to_outline_without_rings_keeps_everything():
+    segs = layout.grid(50, 50, 10)
+    np.testing.assert_array_equal(layout.clip_to_outline(segs, []), segs)
@@ -0,0 +1,260 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import queue
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    import FreeCAD as fc  # type: ignore
+    import Part  # type: ignore
+else:
+    try:
+        import FreeCAD as fc
+        import Part
+    except Exception:
+        fc = None
+        Part = None
+
+import shape_cache
+
+# Ricalcolo in parallelo: ogni ostacolo viene costruito da un processo
+# FreeCADCmd separato che restituisce la forma come file BREP.
+
+MODDIR = os.path.dirname(os.path.abspath(__file__))
+BOOTSTRAP = "import sys; sys.path.insert(0, %r); import workers; workers.worker_main(%r)"
+JOB_TIMEOUT = 1800
+
+def _params():
+    return fc.ParamGet(shape_cache.PARAM_PATH)
+
+def parallel_enabled():
+    return _params().GetBool("ParallelRecompute", True)
+
+def worker_count():
+    n = _params().GetInt("Workers", 0)
+    return n if n > 0 else max(1, (os.cpu_count() or 2) - 1)
+
+def freecad_cmd():
+    """Percorso dell'eseguibile headless di FreeCAD, oppure None."""
+    custom = _params().GetString("WorkerExecutable", "")
+    if custom and os.path.isfile(custom):
+        return custom
+    bindir = os.path.join(fc.getHomePath(), "bin")
+    for name in ("FreeCADCmd", "freecadcmd", "FreeCADCmd.exe", "freecadcmd.exe"):
+        path = os.path.join(bindir, name)
+        if os.path.isfile(path):
+            return path
+    return shutil.which("FreeCADCmd") or shutil.which("freecadcmd")
+
+class Cancelled(Exception):
+    pass
+
+PROGRESS_TAG = "FBPROGRESS "
+
+def _start(exe, workdir, index, job):
+    job = dict(job, output=os.path.join(workdir, f"job{index}.{job.get('ext', 'brep')}"))
+    job_path = os.path.join(workdir, f"job{index}.json")
+    with open(job_path, "w", encoding="utf-8") as f:
+        json.dump(job, f)
+    flags = subprocess.CREATE_NO_WINDOW if os.name == "nt" else 0
+    proc = subprocess.Popen([exe, "-c", BOOTSTRAP % (MODDIR, job_path)], stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, text=True, creationflags=flags)
+    return job, proc
+
+def run_jobs(jobs, on_done, max_workers=None, on_progress=None, cancelled=None, poll=None):
+    """Esegue i job nei worker. Le callback girano nel thread principale:
+    on_done(indice, job o None) a job finito, on_progress(indice, messaggio) per
+    ogni avanzamento riportato dal worker; poll() viene chiamata di continuo
+    (es. processEvents) e cancelled() può interrompere tutto, uccidendo i
+    processi e sollevando Cancelled. Ritorna False se i worker non sono
+    disponibili (il chiamante ripiega sul calcolo seriale)."""
+    exe = freecad_cmd()
+    if exe is None:
+        return False
+    workdir = tempfile.mkdtemp(prefix="fbpark_")
+    events = queue.Queue()
+    procs = {}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def run(index, job):
+        with lock:
+            if stop.is_set():
+                return
+            try:
+                job, proc = _start(exe, workdir, index, job)
+            except OSError:
+                events.put(("done", index, None))
+                return
+            procs[index] = proc
+        # Il timeout vale anche per un worker bloccato che non chiude stdout
+        watchdog = threading.Timer(JOB_TIMEOUT, proc.kill)
+        watchdog.start()
+        ok = False
+        try:
+            for line in proc.stdout:
+                if line.startswith(PROGRESS_TAG):
+                    events.put(("progress", index, line[len(PROGRESS_TAG):].strip()))
+            proc.wait()
+            ok = proc.returncode == 0 and os.path.exists(job["output"]) and not stop.is_set()
+        finally:
+            watchdog.cancel()
+            if proc.poll() is None:
+                proc.kill()
+            events.put(("done", index, job if ok else None))
+
+    pool = ThreadPoolExecutor(max_workers or worker_count())
+    try:
+        for i, job in enumerate(jobs):
+            pool.submit(run, i, job)
+        remaining = len(jobs)
+        while remaining:
+            try:
+                kind, index, data = events.get(timeout=0.05)
+            except queue.Empty:
+                kind = None
+            if kind == "progress" and on_progress:
+                on_progress(index, data)
+            elif kind == "done":
+                remaining -= 1
+                on_done(index, data)
+            if poll:
+                poll()
+            if cancelled and cancelled():
+                with lock:
+                    stop.set()
+                    for proc in procs.values():
+                        if proc.poll() is None:
+                            proc.kill()
+                raise Cancelled()
+    finally:
+        stop.set()
+        pool.shutdown(wait=True)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return True
+
+def load_shape(path):
+    shape = Part.Shape()
+    shape.importBrep(path)
+    return shape
+
+def is_obstacle(obj):
+    import features
+    return isinstance(getattr(obj, "Proxy", None), features.FB_Feature)
+
+def build_job(obj):
+    cls = type(obj.Proxy)
+    # Modulo e cartella della classe: i pacchetti di ostacoli esterni possono
+    # non essere sul path del worker né nella preferenza ObstaclePacks
+    module = sys.modules[cls.__module__]
+    return {"task": "build", "class": cls.__name__, "module": cls.__module__,
+            "path": os.path.dirname(os.path.abspath(module.__file__)), "label": obj.Label,
+            "params": shape_cache.geometry_params(obj)}
+
+def pending_exports(objs):
+    """Ostacoli che al livello Export non hanno ancora la forma in cache."""
+    pending = []
+    for o in objs:
+        key = shape_cache.shape_key(o)
+        if shape_cache.get(key) is None:
+            pending.append((o, key))
+    return pending
+
+def prefetch(objs):
+    """Costruisce in parallelo, e mette nella cache forme, gli ostacoli a livello
+    Export non ancora in cache. Non tocca il documento."""
+    import features
+    if not (parallel_enabled() and shape_cache.enabled()):
+        return
+    # Solo gli oggetti con texture reale: anteprima e block-out sono già veloci
+    pending = pending_exports([o for o in objs if is_obstacle(o) and features.texture_level(o) == "Export"])
+    if len(pending) < 2:
+        return
+    failed = []
+    def on_done(i, job):
+        obj, key = pending[i]
+        try:
+            if job is None:
+                raise RuntimeError("worker fallito")
+            shape_cache.put(key, load_shape(job["output"]))
+        except Exception:
+            failed.append(obj.Label)
+    try:
+        if not run_jobs([build_job(o) for o, _ in pending], on_done):
+            fc.Console.PrintWarning("FreeCADCmd non trovato: ricalcolo seriale.\n")
+    except Exception as e:
+        fc.Console.PrintWarning(f"Ricalcolo parallelo non riuscito ({e}): ricalcolo seriale.\n")
+    if failed:
+        fc.Console.PrintWarning(f"Ricalcolo seriale per: {', '.join(failed)}\n")
+
+def recompute_parallel(doc, objs=None):
+    """Ricalcola il documento costruendo in parallelo gli ostacoli da aggiornare.
+    Senza worker (o con la cache forme disattivata) è un normale doc.recompute()."""
+    objs = objs if objs is not None else doc.Objects
+    prefetch([o for o in objs if o.mustExecute()])
+    # Le forme pronte sono in cache: execute le assegna a fp.Shape senza ricalcolarle
+    doc.recompute()
+
+# --- LATO WORKER (eseguito dentro FreeCADCmd) ---
+
+def progress(msg):
+    print(PROGRESS_TAG + msg, flush=True)
+
+def _task_build(job):
+    import brick_utils
+    import features
+    import registry
+    brick_utils.progress_hook = progress
+    if job.get("path") and job["path"] not in sys.path:
+        sys.path.append(job["path"])
+    if job.get("module"):
+        registry.add_pack(job["module"])
+    doc = fc.newDocument("FBWorker")
+    try:
+        obj = doc.addObject("Part::FeaturePython", job["class"])
+        registry.obstacle_class(job["class"])(obj)
+        for name, value in job["params"].items():
+            if hasattr(obj, name):
+                setattr(obj, name, value)
+        obj.LOD = "Export"
+        shape = obj.Proxy.build(obj)
+        if shape is None or shape.isNull():
+            raise RuntimeError("forma vuota")
+        if getattr(obj.Proxy, "_failed", None):
+            # Il ricalcolo seriale riporta le fasce fallite in TextureStatus
+            raise RuntimeError(features.failure_report(obj.Proxy._failed))
+        shape.exportBrep(job["output"])
+    finally:
+        fc.closeDocument(doc.Name)
+
+def _task_split(job):
+    import split
+    shape = load_shape(job["input"])
+    part_a, part_b = split.split_by_proxy(shape, split.placement_from_list(job["placement"]), progress)
+    Part.makeCompound([part_a, part_b]).exportBrep(job["output"])
+
+def _task_split_planes(job):
+    import split
+    shape = load_shape(job["input"])
+    pieces = split.split_by_planes(shape, [split.placement_from_list(p) for p in job["placements"]], progress)
+    Part.makeCompound(pieces).exportBrep(job["output"])
+
+def _task_tessellate(job):
+    import stl
+    stl.write_shape(job["output"], load_shape(job["input"]), job["deflection"])
+
+def _task_merge(job):
+    import merge
+    merge.fuse([load_shape(p) for p in job["inputs"]]).exportBrep(job["output"])
+
+TASKS = {"build": _task_build, "split": _task_split, "split_planes": _task_split_planes,
+         "tessellate": _task_tessellate, "merge": _task_merge}
+
+def worker_main(job_path):
+    with open(job_path, encoding="utf-8") as f:
+        job = json.load(f)
+    TASKS[job["task"]](job)